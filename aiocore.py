@@ -0,0 +1,287 @@
+"""An asyncio event loop for wurstminebot, used instead of the InputLoop and TimeLoop threads, threading.Timer, and the ircbotframe connection thread when the bot is started with --asyncio.
+
+install replaces the bot's IRC connection, InputLoop, TimeLoop, and Timer with adapters that run on one event loop, which then runs in the bot's main thread as part of bot.run(). The existing event handlers (PRIVMSG and friends, InputLoop.process_log_line, telltime) are reused unchanged, so the log input and IRC messages are handled one at a time and no longer race on globals like LASTDEATH and PREVIOUS_TOPIC. The HTTP lookups still use requests and are not made on the loop. Instead, they run on threads like other work which would block: slow commands and the Mojira and tweet auto-pastes in the CommandPool, tweets in the TweetQueue, and the hourly telltime (which may restart the server) and timer functions (which update the server status and write files) in the loop's default executor. Commands which aren't marked as slow, and the update_all after connecting, still run on the loop. The adapters are thread-safe, so these threads can still use the bot.
+
+This module needs Python 3.7 or later.
+"""
+
+import asyncio
+import functools
+import queue
+import ssl
+import time
+import traceback
+
+class LoopTimer:
+    """A replacement for threading.Timer which waits interval seconds on the event loop, then calls function in the loop's default executor, since timer functions like update_all may block."""
+    def __init__(self, loop, interval, function, args=None, kwargs=None):
+        self.args = [] if args is None else args
+        self.cancelled = False
+        self.daemon = True # ignored, for compatibility with threading.Timer
+        self.function = function
+        self.handle = None
+        self.interval = interval
+        self.kwargs = {} if kwargs is None else kwargs
+        self.loop = loop
+    
+    def _cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+    
+    def _done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            traceback.print_exception(type(future.exception()), future.exception(), future.exception().__traceback__) # like an exception in a threading.Timer
+    
+    def _fire(self):
+        if not self.cancelled:
+            self.loop.run_in_executor(None, functools.partial(self.function, *self.args, **self.kwargs)).add_done_callback(self._done)
+    
+    def _schedule(self):
+        if not self.cancelled:
+            self.handle = self.loop.call_later(self.interval, self._fire)
+    
+    def cancel(self):
+        self.cancelled = True
+        self.loop.call_soon_threadsafe(self._cancel)
+    
+    def start(self):
+        self.loop.call_soon_threadsafe(self._schedule)
+
+class AsyncIRCBot:
+    """Implements the parts of ircbotframe's ircBot used by wurstminebot on top of asyncio streams.
+    
+    Handlers registered with bind are called on the event loop with the same (sender, headers, message) arguments as with ircbotframe. Messages can be sent from any thread.
+    """
+    def __init__(self, loop, network, port, name, description, password=None, ssl=False, log_length=100):
+        self.binds = {}
+        self.channel_data = {}
+        self.debug = False
+        self.description = description
+        self.keepGoing = True
+        self.log_length = log_length
+        self.log_own_messages = True
+        self.loop = loop
+        self.name = name
+        self.network = network
+        self.outgoing = queue.Queue()
+        self.password = password
+        self.port = port
+        self.ssl = ssl
+        self.writer = None
+    
+    def _dispatch(self, msg_type, sender, headers, message):
+        if msg_type in self.binds:
+            self.binds[msg_type](sender, headers, message)
+    
+    def _flush(self):
+        """Writes the queued lines to the connection. Must be called on the event loop."""
+        while True:
+            try:
+                line = self.outgoing.get_nowait()
+            except queue.Empty:
+                return
+            if self.writer is None or self.writer.is_closing():
+                continue # not connected, drop the line like ircbotframe does
+            if self.debug:
+                print('[irc] >>> ' + line)
+            self.writer.write((line + '\r\n').encode('utf-8'))
+    
+    def _hang_up(self):
+        self._flush()
+        if self.writer is not None:
+            self.writer.close() # makes the pending read return, ending the connection
+    
+    def _handle_line(self, line):
+        if self.debug:
+            print('[irc] <<< ' + line)
+        prefix = None
+        if line.startswith(':'):
+            prefix, _, line = line[1:].partition(' ')
+        if ' :' in line:
+            line, message = line.split(' :', 1)
+        elif line.startswith(':'):
+            line, message = '', line[1:]
+        else:
+            message = None
+        headers = line.split()
+        if not len(headers):
+            return
+        msg_type = headers.pop(0).upper()
+        sender = None if prefix is None else prefix.split('!', 1)[0]
+        if msg_type == 'PING':
+            self.send('PONG :' + ('' if message is None else message))
+            return
+        if msg_type == '433': # nick in use
+            self.name += '_'
+            self.send('NICK ' + self.name)
+            return
+        if msg_type == 'JOIN' and sender == self.name:
+            chan = headers[0] if len(headers) else message
+            self.channel_data.setdefault(chan, {'log': []})
+        if msg_type == 'PRIVMSG' and message is not None and message.startswith('\x01ACTION ') and message.endswith('\x01'):
+            msg_type = 'ACTION'
+            message = message[len('\x01ACTION '):-1]
+        if msg_type in ('ACTION', 'PRIVMSG') and len(headers) and headers[0].startswith('#'):
+            self.log(headers[0], msg_type, sender, headers, message)
+        self._dispatch(msg_type, sender, headers, message)
+    
+    def _on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+    
+    async def _connection(self):
+        if self.ssl:
+            reader, self.writer = await asyncio.open_connection(self.network, self.port, ssl=ssl.create_default_context())
+        else:
+            reader, self.writer = await asyncio.open_connection(self.network, self.port)
+        if self.password is not None:
+            self.send('PASS ' + self.password)
+        self.send('NICK ' + self.name)
+        self.send('USER ' + self.name + ' 0 * :' + self.description)
+        try:
+            while self.keepGoing:
+                line = await reader.readline()
+                if not line:
+                    break # connection closed
+                self._handle_line(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+        finally:
+            self._flush()
+            self.writer.close()
+            self.writer = None
+    
+    def bind(self, msg_type, callback):
+        self.binds[msg_type] = callback
+    
+    def debugging(self, state):
+        self.debug = bool(state)
+    
+    def disconnect(self, message):
+        self.send('QUIT :' + message)
+        if self._on_loop():
+            self._flush() # the quit command exits right after this, before the loop gets to it
+    
+    def joinchan(self, chan):
+        self.channel_data.setdefault(chan, {'log': []})
+        self.send('JOIN ' + chan)
+    
+    def log(self, chan, msg_type, sender, headers, message):
+        chan_log = self.channel_data.setdefault(chan, {'log': []})['log']
+        chan_log.append((msg_type, sender, headers, message))
+        del chan_log[:-self.log_length]
+    
+    def run(self):
+        self.keepGoing = True
+        try:
+            self.loop.run_until_complete(self._connection())
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    
+    def say(self, recipient, message):
+        if self.log_own_messages and recipient.startswith('#'):
+            self.log(recipient, 'PRIVMSG', self.name, [recipient], message)
+        self.send('PRIVMSG ' + recipient + ' :' + message)
+    
+    def send(self, string):
+        self.outgoing.put(string)
+        self.loop.call_soon_threadsafe(self._flush)
+    
+    def stop(self):
+        self.keepGoing = False
+        self.loop.call_soon_threadsafe(self._hang_up)
+    
+    def topic(self, channel, message):
+        self.send('TOPIC ' + channel + ' :' + message)
+
+class _Task:
+    """Base class for InputLoop and TimeLoop: runs the subclass's run coroutine as a task on the loop once started, like the threaded versions run their threads. start and stop can be called from any thread."""
+    def __init__(self, loop):
+        self.loop = loop
+        self.stopped = False
+        self.task = None
+    
+    def _start(self):
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self.run())
+    
+    def _stop(self):
+        if self.task is not None:
+            self.task.cancel()
+    
+    def start(self):
+        self.stopped = False
+        self.loop.call_soon_threadsafe(self._start)
+    
+    def stop(self):
+        self.stopped = True
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._stop)
+
+class InputLoop(_Task):
+    """Replaces wurstminebot.InputLoop: follows the server log without blocking the event loop, and feeds each line to the original process_log_line."""
+    def __init__(self, loop, wurstminebot, timeout=0.5):
+        super().__init__(loop)
+        self.process_log_line = wurstminebot.InputLoop.process_log_line
+        self.timeout = timeout
+        self.wurstminebot = wurstminebot
+    
+    async def _wait(self, watcher):
+        while watcher.fd is not None:
+            fd = watcher.fd
+            readable = self.loop.create_future()
+            self.loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+            try:
+                await readable
+            finally:
+                self.loop.remove_reader(fd)
+            if watcher.read_events():
+                return
+        await asyncio.sleep(self.timeout)
+    
+    async def run(self):
+        for item in self.wurstminebot._logtail(timeout=self.timeout, block=False):
+            if isinstance(item, self.wurstminebot._LogWatcher):
+                await self._wait(item)
+            else:
+                self.process_log_line(item)
+                await asyncio.sleep(0) # let IRC and timers run between the lines of a long burst
+            if self.stopped or not self.wurstminebot.bot.keepGoing:
+                break
+
+class TimeLoop(_Task):
+    """Replaces wurstminebot.TimeLoop: calls telltime at the start of every hour."""
+    def __init__(self, loop, wurstminebot):
+        super().__init__(loop)
+        self.wurstminebot = wurstminebot
+    
+    async def run(self):
+        while not self.stopped:
+            # sleep in steps of at most a minute, so that changes to the system clock (like leap seconds) are noticed
+            next_hour = time.time() + 3601 - time.time() % 3600
+            while time.time() < next_hour:
+                await asyncio.sleep(min(next_hour - time.time(), 60))
+            try:
+                await self.loop.run_in_executor(None, functools.partial(self.wurstminebot.telltime, comment=True, restart=self.wurstminebot.config('daily_restart', True)))
+            except Exception:
+                self.wurstminebot._debug_print('Exception in telltime:')
+                if self.wurstminebot.config('debug', False):
+                    traceback.print_exc()
+
+def install(wurstminebot):
+    """Switches the given wurstminebot module to asyncio mode. Must be called before starting anything, from the thread which will call wurstminebot.bot.run()."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    irc_config = wurstminebot.config('irc')
+    bot = AsyncIRCBot(loop, irc_config['server'], irc_config['port'], irc_config['nick'], irc_config['nick'], password=irc_config['password'], ssl=irc_config['ssl'])
+    bot.log_own_messages = wurstminebot.bot.log_own_messages
+    for msg_type, handler_name in (('376', 'endMOTD'), ('ACTION', 'action'), ('JOIN', 'join'), ('PART', 'part'), ('PRIVMSG', 'privmsg')):
+        bot.bind(msg_type, getattr(wurstminebot, handler_name))
+    wurstminebot.bot = bot
+    wurstminebot.InputLoop = InputLoop(loop, wurstminebot)
+    wurstminebot.TimeLoop = TimeLoop(loop, wurstminebot)
+    wurstminebot.Timer = functools.partial(LoopTimer, loop)
+    return loop
@@ -1,9 +1,11 @@
 # http://www.minecraftwiki.net/wiki/Server#Death_messages
 
+import contextlib
 import datetime
 import minecraft
 import nicksub
 import re
+import sqlite3
 
 messages = [
     {
@@ -216,27 +218,33 @@ messages = [
     }
 ]
 
+_message_regexes = [re.compile('(' + minecraft.regexes.timestamp + ') \\[Server thread/INFO\\]: (' + minecraft.regexes.player + ') ' + death['regex'] + '$') for death in messages]
+_first_words = frozenset(death['regex'].split(' ', 1)[0] for death in messages) # every death message starts with the player name followed by one of these words
+# all death messages in one pattern, so that a line which is not a death can be rejected with a single match
+_messages_regex = re.compile('(?:' + minecraft.regexes.timestamp + ') \\[Server thread/INFO\\]: (?:' + minecraft.regexes.player + ') (?:' + '|'.join('(?P<death' + str(index) + '>' + death['regex'] + ')$' for index, death in enumerate(messages)) + ')')
+
 def mcnick(person):
     return person.minecraft if isinstance(person, nicksub.Person) else str(person)
 
 class Death:
     def __init__(self, log_line):
-        for death in messages:
-            match = re.match('(' + minecraft.regexes.timestamp + ') \\[Server thread/INFO\\]: (' + minecraft.regexes.player + ') ' + death['regex'] + '$', log_line)
-            if not match:
-                continue
-            # death
-            self.id = death['id']
-            self.timestamp = minecraft.regexes.strptime(datetime.date.today(), match.group(1))
-            try:
-                self.person = nicksub.Person(match.group(2), context='minecraft')
-            except nicksub.PersonNotFoundError:
-                self.person = match.group(2)
-            self.partial_message = log_line[len('[00:00:00] [Server thread/INFO]: ' + mcnick(self.person) + ' '):]
-            self.groups = match.groups()[2:]
-            break
-        else:
+        words = log_line.partition(' [Server thread/INFO]: ')[2].split(' ', 2)
+        if len(words) < 2 or words[1] not in _first_words:
             raise ValueError('Log line is not a death')
+        match = _messages_regex.match(log_line)
+        if not match:
+            raise ValueError('Log line is not a death')
+        # death
+        index = int(match.lastgroup[len('death'):]) # the first death message that matches, like trying them in order
+        match = _message_regexes[index].match(log_line) # for the groups of that death message
+        self.id = messages[index]['id']
+        self.timestamp = minecraft.regexes.strptime(datetime.date.today(), match.group(1))
+        try:
+            self.person = nicksub.Person(match.group(2), context='minecraft')
+        except nicksub.PersonNotFoundError:
+            self.person = match.group(2)
+        self.partial_message = log_line[len('[00:00:00] [Server thread/INFO]: ' + mcnick(self.person) + ' '):]
+        self.groups = match.groups()[2:]
     
     def irc_message(self, tweet_info=None):
         if isinstance(self.person, nicksub.Person):
@@ -260,3 +268,113 @@ class Death:
         if len(status + ' … ' + comment) <= 140:
             status += ' … ' + comment
         return status
+
+class DeathStore:
+    """Deaths in an SQLite database, indexed by person, Minecraft nick, cause (the Death.id), and time."""
+    
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS deaths (timestamp TEXT NOT NULL, minecraft TEXT NOT NULL, person TEXT, cause TEXT NOT NULL, killer TEXT, weapon TEXT, message TEXT NOT NULL, UNIQUE (timestamp, minecraft, message))')
+            db.execute('CREATE INDEX IF NOT EXISTS deaths_person ON deaths (person, timestamp)')
+            db.execute('CREATE INDEX IF NOT EXISTS deaths_minecraft ON deaths (minecraft, timestamp)')
+            db.execute('CREATE INDEX IF NOT EXISTS deaths_cause ON deaths (cause)')
+            db.execute('CREATE INDEX IF NOT EXISTS deaths_timestamp ON deaths (timestamp)')
+    
+    @contextlib.contextmanager
+    def _connect(self):
+        # a new connection each time, since deaths are recorded from the input loop and queried from commands on other threads
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db: # commits, or rolls back on an exception
+                yield db
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _row(death):
+        return (
+            death.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            mcnick(death.person),
+            death.person.id if isinstance(death.person, nicksub.Person) else None,
+            death.id,
+            death.groups[0] if len(death.groups) > 0 else None,
+            death.groups[1] if len(death.groups) > 1 else None,
+            death.message()
+        )
+    
+    def add(self, death):
+        with self._connect() as db:
+            db.execute('INSERT OR IGNORE INTO deaths VALUES (?, ?, ?, ?, ?, ?, ?)', self._row(death))
+    
+    def import_log(self, path):
+        """Imports the deaths from a deaths.log file, in which each line is a death message prefixed with a timestamp in %Y-%m-%d %H:%M:%S format. Deaths that are already in the database are skipped. Returns the number of lines that were imported and the number of lines that could not be parsed."""
+        imported = 0
+        failed = 0
+        rows = []
+        with open(path) as deathslog:
+            for line in deathslog:
+                line = line.rstrip('\r\n')
+                if not line:
+                    continue
+                try:
+                    timestamp = datetime.datetime.strptime(line[:19], '%Y-%m-%d %H:%M:%S')
+                    death = Death('[' + timestamp.strftime('%H:%M:%S') + '] [Server thread/INFO]: ' + line[20:])
+                except ValueError:
+                    failed += 1
+                    continue
+                death.timestamp = timestamp
+                rows.append(self._row(death))
+        with self._connect() as db:
+            for row in rows:
+                imported += db.execute('INSERT OR IGNORE INTO deaths VALUES (?, ?, ?, ?, ?, ?, ?)', row).rowcount
+        return imported, failed
+    
+    def count(self, person=None, minecraft=None, since=None):
+        """Returns the number of deaths, optionally only those of the given person (id) or Minecraft nick, and only those since the given datetime."""
+        query = 'SELECT COUNT(*) FROM deaths WHERE 1'
+        params = []
+        if person is not None:
+            query += ' AND person = ?'
+            params.append(person)
+        if minecraft is not None:
+            query += ' AND minecraft = ?'
+            params.append(minecraft)
+        if since is not None:
+            query += ' AND timestamp >= ?'
+            params.append(since.strftime('%Y-%m-%d %H:%M:%S'))
+        with self._connect() as db:
+            return db.execute(query, params).fetchone()[0]
+    
+    def latest(self, person=None, minecraft=None, limit=1):
+        """Returns the most recent deaths of the given person (id) or Minecraft nick as a list of (datetime, death message) pairs, newest first."""
+        if person is not None:
+            query = 'SELECT timestamp, message FROM deaths WHERE person = ? ORDER BY timestamp DESC LIMIT ?'
+            params = (person, limit)
+        else:
+            query = 'SELECT timestamp, message FROM deaths WHERE minecraft = ? ORDER BY timestamp DESC LIMIT ?'
+            params = (minecraft, limit)
+        with self._connect() as db:
+            return [(datetime.datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S'), message) for timestamp, message in db.execute(query, params)]
+    
+    def top_causes(self, limit=5, since=None):
+        """Returns the most common death causes (Death.id values) as a list of (cause, number of deaths) pairs."""
+        if since is None:
+            query = 'SELECT cause, COUNT(*) AS n FROM deaths GROUP BY cause ORDER BY n DESC, cause LIMIT ?'
+            params = (limit,)
+        else:
+            query = 'SELECT cause, COUNT(*) AS n FROM deaths WHERE timestamp >= ? GROUP BY cause ORDER BY n DESC, cause LIMIT ?'
+            params = (since.strftime('%Y-%m-%d %H:%M:%S'), limit)
+        with self._connect() as db:
+            return db.execute(query, params).fetchall()
+    
+    def top_players(self, limit=5, since=None):
+        """Returns the Minecraft nicks with the most deaths as a list of (nick, number of deaths) pairs."""
+        if since is None:
+            query = 'SELECT minecraft, COUNT(*) AS n FROM deaths GROUP BY minecraft ORDER BY n DESC, minecraft LIMIT ?'
+            params = (limit,)
+        else:
+            query = 'SELECT minecraft, COUNT(*) AS n FROM deaths WHERE timestamp >= ? GROUP BY minecraft ORDER BY n DESC, minecraft LIMIT ?'
+            params = (since.strftime('%Y-%m-%d %H:%M:%S'), limit)
+        with self._connect() as db:
+            return db.execute(query, params).fetchall()
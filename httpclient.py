@@ -0,0 +1,110 @@
+"""A shared HTTP client for looking things up on other websites.
+
+All requests go through one requests session, so connections are kept alive and reused. Each host gets a limited number of concurrent requests, every request has a timeout, and a host which keeps failing is not contacted again until a cooldown has passed (a circuit breaker), so that a service which is down or hangs can't hold up the bot.
+"""
+
+import requests
+import requests.adapters
+import threading
+import time
+import urllib.parse
+
+class ServiceUnavailableError(requests.exceptions.RequestException):
+    pass # raised instead of making a request when the host's circuit breaker is open or too many requests to it are in progress
+
+class HTTPClient:
+    def __init__(self, timeout=(3.05, 10), max_per_host=4, failure_threshold=5, cooldown=60, pool_maxsize=10):
+        """timeout: the default timeout for requests, in seconds, as a number or a (connect timeout, read timeout) pair.
+        max_per_host: how many requests to the same host can be in progress at the same time. Further requests wait for at most the connect timeout, then fail.
+        failure_threshold: after this many failures (connection errors, timeouts, or 5xx responses) in a row, requests to the host fail without being made.
+        cooldown: how many seconds after the last failure to let a single request to the host through again. If it succeeds, the host is back to normal.
+        pool_maxsize: how many connections per host to keep alive.
+        """
+        self.cooldown = cooldown
+        self.failure_threshold = failure_threshold
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.max_per_host = max_per_host
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.timeout = timeout
+    
+    def _host(self, host):
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = {
+                    'failures': 0, # failures in a row
+                    'last_failure': 0.0,
+                    'semaphore': threading.BoundedSemaphore(self.max_per_host),
+                    'trial': False # whether a request is in progress to see if the host is back after the cooldown
+                }
+            return self.hosts[host]
+    
+    def _before(self, host_state, host):
+        with self.lock:
+            if host_state['failures'] >= self.failure_threshold:
+                if host_state['trial'] or time.time() - host_state['last_failure'] < self.cooldown:
+                    raise ServiceUnavailableError(host + ' is unavailable after ' + str(host_state['failures']) + ' failures')
+                host_state['trial'] = True
+    
+    def _after(self, host_state, success):
+        """Records the outcome of a request. success is None if the request failed in a way which says nothing about the host, like an invalid URL."""
+        with self.lock:
+            host_state['trial'] = False
+            if success is None:
+                pass
+            elif success:
+                host_state['failures'] = 0
+            else:
+                host_state['failures'] += 1
+                host_state['last_failure'] = time.time()
+    
+    def call(self, host, function, *args, **kwargs):
+        """Calls function(*args, **kwargs) as a request to the given host, for clients which make their own requests. Connection errors, timeouts, and return values with a status_code of 500 or more count as failures. Other exceptions are passed on without counting either way."""
+        host_state = self._host(host)
+        self._before(host_state, host)
+        wait = self.timeout[0] if isinstance(self.timeout, tuple) else self.timeout
+        if not host_state['semaphore'].acquire(timeout=wait):
+            with self.lock:
+                host_state['trial'] = False # not the host's fault, so only the trial ends
+            raise ServiceUnavailableError('too many requests to ' + host + ' in progress')
+        try:
+            try:
+                ret = function(*args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._after(host_state, False)
+                raise
+            except:
+                self._after(host_state, None)
+                raise
+            self._after(host_state, getattr(ret, 'status_code', 200) < 500)
+            return ret
+        finally:
+            host_state['semaphore'].release()
+    
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+    
+    def request(self, method, url, **kwargs):
+        """Makes a request using the shared session. Takes the same arguments as requests.request; the timeout defaults to the client's timeout."""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.call(urllib.parse.urlsplit(url).netloc, self.session.request, method, url, **kwargs)
+    
+    def stats(self):
+        """Returns a dict mapping each host to its number of failures in a row and whether requests to it currently fail without being made."""
+        now = time.time()
+        with self.lock:
+            return dict((host, {
+                'failures': host_state['failures'],
+                'open': host_state['failures'] >= self.failure_threshold and (host_state['trial'] or now - host_state['last_failure'] < self.cooldown)
+            }) for host, host_state in self.hosts.items())
+
+client = HTTPClient()
+
+def get(url, **kwargs):
+    return client.get(url, **kwargs)
+
+def request(method, url, **kwargs):
+    return client.request(method, url, **kwargs)
@@ -27,61 +27,214 @@ def parseVersionString():
 
 __version__ = str(parseVersionString())
 
+import contextlib
+import copy
 from docopt import docopt
+import fcntl
 import json
+import os
 import sys
 import re
+import tempfile
+import threading
+import time
 
 CONFIG_FILE = '/opt/wurstmineberg/config/people.json'
 if __name__ == '__main__':
     arguments = docopt(__doc__, version='nicksub (wurstminebot ' + __version__ + ')')
     CONFIG_FILE = arguments['--config']
 
+_people_cache = {
+    'checked': 0.0, # when the people file was last checked for changes
+    'indexes': {}, # see _people_indexes
+    'people': [], # the parsed people file
+    'stat': None, # the (mtime, size) of the people file when it was loaded
+    'substituters': {} # the _Substituter for each (source, target, strict), see textsub
+}
+_people_lock = threading.Lock()
+_transaction_lock = threading.RLock() # held for the duration of a transaction, so that the bot's threads take turns
+_transaction_state = threading.local() # the working copy of the people file of the current thread's transaction, if any
+
+def _people_indexes(people):
+    """Returns dicts mapping ids and lowercased nicks to the people they belong to, one per context. If several people have the same nick, the first one wins, like when searching the list."""
+    indexes = {
+        'id': {},
+        'irc': {},
+        'minecraft': {},
+        'nicks': {},
+        'reddit': {},
+        'twitter': {}
+    }
+    for person in people:
+        if 'id' not in person:
+            continue
+        indexes['id'].setdefault(person['id'], person) # ids are case-sensitive
+        for nick in person.get('irc', {}).get('nicks', []):
+            indexes['irc'].setdefault(nick.lower(), person)
+        for nick in person.get('nicks', []):
+            indexes['nicks'].setdefault(nick.lower(), person)
+        for context in ('minecraft', 'reddit', 'twitter'):
+            if isinstance(person.get(context), str):
+                indexes[context].setdefault(person[context].lower(), person)
+    return indexes
+
+def _people_snapshot(reload=False):
+    """Returns the people cache, loading the people file if necessary. The file is checked for changes at most once a second, and only parsed again if its mtime or size changed.
+    
+    Inside a transaction, the transaction's working copy is returned instead, so that changes are visible to the thread making them before they are committed.
+    """
+    working_copy = getattr(_transaction_state, 'working_copy', None)
+    if working_copy is not None:
+        if working_copy['indexes'] is None:
+            working_copy['indexes'] = _people_indexes(working_copy['people'])
+            working_copy['substituters'] = {}
+        return working_copy
+    with _people_lock:
+        now = time.time()
+        if reload or now - _people_cache['checked'] >= 1.0:
+            _people_cache['checked'] = now
+            try:
+                stat = os.stat(CONFIG_FILE)
+                file_stat = (stat.st_mtime, stat.st_size)
+            except OSError:
+                file_stat = None
+            if reload or file_stat is None or file_stat != _people_cache['stat']:
+                try:
+                    with open(CONFIG_FILE) as config_file:
+                        people = json.load(config_file)
+                except:
+                    people = []
+                _people_cache['indexes'] = _people_indexes(people)
+                _people_cache['people'] = people
+                _people_cache['stat'] = file_stat
+                _people_cache['substituters'] = {}
+        return _people_cache
+
+def _person_data(context, id_or_nick):
+    """Returns the people file entry of the person with this id or nick in the given context, or raises KeyError."""
+    indexes = _people_snapshot()['indexes']
+    if context == 'id':
+        return indexes['id'][id_or_nick]
+    return indexes[context][id_or_nick.lower()]
+
 def config(person_id=None):
-    try:
-        with open(CONFIG_FILE) as config_file:
-            j = json.load(config_file)
-    except:
-        j = []
+    """Returns the people file, or the entry of the person with the given id. The returned data is shared with the cache and must not be modified."""
     if person_id is None:
-        return j
-    for person in j:
-        if person.get('id') == person_id:
-            return person
-    else:
+        return _people_snapshot()['people']
+    try:
+        return _person_data('id', person_id)
+    except KeyError:
         raise PersonNotFoundError('person with id ' + str(person_id) + ' not found')
 
+def reload_config():
+    _people_snapshot(reload=True)
+
+def _write_people(people):
+    """Atomically replaces the people file: the new contents are written to a temporary file in the same directory, synced to disk, and renamed over the old file."""
+    config_dir = os.path.dirname(os.path.abspath(CONFIG_FILE))
+    fd, tmp_path = tempfile.mkstemp(dir=config_dir, prefix='.people.', suffix='.json.tmp')
+    try:
+        with open(fd, 'w') as tmp_file:
+            json.dump(people, tmp_file, sort_keys=True, indent=4, separators=(',', ': '))
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        try:
+            os.chmod(tmp_path, os.stat(CONFIG_FILE).st_mode & 0o7777) # mkstemp creates the file as 0600
+        except OSError:
+            pass
+        os.rename(tmp_path, CONFIG_FILE)
+    except:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    stat = os.stat(CONFIG_FILE)
+    with _people_lock:
+        _people_cache['checked'] = time.time()
+        _people_cache['indexes'] = _people_indexes(people)
+        _people_cache['people'] = people
+        _people_cache['stat'] = (stat.st_mtime, stat.st_size)
+        _people_cache['substituters'] = {}
+
+@contextlib.contextmanager
+def transaction():
+    """Groups several changes to the people file into one write.
+    
+    Usage:
+        with nicksub.transaction():
+            person.name = 'Name'
+            person.twitter = 'name'
+    
+    The people file is locked (using an advisory lock on a .lock file next to it, which is also respected by other processes using this module), read, and changed in memory by the Person setters, update_config, and set_config. When the block exits normally, the file is written once, atomically. If the block raises an exception, the changes are discarded. Nested transactions are part of the outermost one.
+    """
+    if getattr(_transaction_state, 'working_copy', None) is not None:
+        yield # already in a transaction on this thread
+        return
+    with _transaction_lock:
+        with open(CONFIG_FILE + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(CONFIG_FILE):
+                    with open(CONFIG_FILE) as config_file:
+                        people = json.load(config_file) # read from disk, not from the cache, so changes made by other processes are never lost
+                else:
+                    people = []
+                _transaction_state.working_copy = {
+                    'changed': False,
+                    'indexes': None,
+                    'people': people,
+                    'substituters': {}
+                }
+                try:
+                    yield
+                    if _transaction_state.working_copy['changed']:
+                        _write_people(_transaction_state.working_copy['people'])
+                finally:
+                    _transaction_state.working_copy = None
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _changed(people=None):
+    """Marks the working copy of the current transaction as changed, optionally replacing its contents."""
+    working_copy = _transaction_state.working_copy
+    if people is not None:
+        working_copy['people'] = people
+    working_copy['changed'] = True
+    working_copy['indexes'] = None
+
 def set_config(config_dict):
-    with open(CONFIG_FILE, 'w') as config_file:
-        json.dump(config_dict, config_file, sort_keys=True, indent=4, separators=(',', ': '))
+    with transaction():
+        _changed(people=copy.deepcopy(config_dict))
 
 def update_config(person_id, path, value=None, delete=False):
-    config_dict = config()
-    full_config_dict = config_dict
-    for index, person in enumerate(config_dict):
-        if person.get('id') == person_id:
-            config_dict = config_dict[index]
-            break
-    else:
-        raise PersonNotFoundError('person with id ' + str(person_id) + ' not found')
-    if len(path) > 1:
-        for key in path[:-1]:
-            if not isinstance(config_dict, dict):
-                raise KeyError('Trying to update a non-dict config key')
-            if key not in config_dict:
-                config_dict[key] = {}
-            config_dict = config_dict[key]
-    if len(path) > 0:
-        if delete:
-            del config_dict[path[-1]]
+    with transaction():
+        full_config_dict = _transaction_state.working_copy['people']
+        config_dict = full_config_dict
+        for index, person in enumerate(config_dict):
+            if person.get('id') == person_id:
+                config_dict = config_dict[index]
+                break
         else:
-            config_dict[path[-1]] = value
-    else:
-        if delete:
-            del full_config_dict[index]
+            raise PersonNotFoundError('person with id ' + str(person_id) + ' not found')
+        if len(path) > 1:
+            for key in path[:-1]:
+                if not isinstance(config_dict, dict):
+                    raise KeyError('Trying to update a non-dict config key')
+                if key not in config_dict:
+                    config_dict[key] = {}
+                config_dict = config_dict[key]
+        if len(path) > 0:
+            if delete:
+                del config_dict[path[-1]]
+            else:
+                config_dict[path[-1]] = copy.deepcopy(value)
         else:
-            full_config_dict[index] = value
-    set_config(full_config_dict)
+            if delete:
+                del full_config_dict[index]
+            else:
+                full_config_dict[index] = copy.deepcopy(value)
+        _changed()
 
 class PersonNotFoundError(Exception):
     pass # raised when a Person object is created or reloaded with data not in the config
@@ -146,36 +299,28 @@ class Person:
             self.id = id_or_nick
             config(self.id) # raises PersonNotFoundError if the id is invalid
         elif context == 'irc':
-            for id, irc_nick in ircNicks(mode='all', include_ids=True):
-                if irc_nick.lower() == id_or_nick.lower():
-                    self.id = id
-                    break
-            else:
+            try:
+                self.id = _person_data('irc', id_or_nick)['id']
+            except KeyError:
                 raise PersonNotFoundError('person with IRC nick ' + str(id_or_nick) + ' not found')
         elif context == 'minecraft':
-            for id, minecraft_nick in minecraftNicks(include_ids=True):
-                if minecraft_nick.lower() == id_or_nick.lower():
-                    self.id = id
-                    break
-            else:
+            try:
+                self.id = _person_data('minecraft', id_or_nick)['id']
+            except KeyError:
                 raise PersonNotFoundError()
         elif context == 'reddit':
-            for id, reddit_nick in redditNicks(include_ids=True, format='plain'):
-                if id_or_nick.startswith('/u/'):
-                    id_or_nick = id_or_nick[len('/u/'):]
-                if reddit_nick.lower() == id_or_nick.lower():
-                    self.id = id
-                    break
-            else:
+            if id_or_nick.startswith('/u/'):
+                id_or_nick = id_or_nick[len('/u/'):]
+            try:
+                self.id = _person_data('reddit', id_or_nick)['id']
+            except KeyError:
                 raise PersonNotFoundError('person with reddit nick ' + str(id_or_nick) + ' not found')
         elif context == 'twitter':
-            for id, twitter_nick in twitterNicks(include_ids=True, twitter_at_prefix=False):
-                if id_or_nick.startswith('@'):
-                    id_or_nick = id_or_nick[len('@'):]
-                if twitter_nick.lower() == id_or_nick.lower():
-                    self.id = id
-                    break
-            else:
+            if id_or_nick.startswith('@'):
+                id_or_nick = id_or_nick[len('@'):]
+            try:
+                self.id = _person_data('twitter', id_or_nick)['id']
+            except KeyError:
                 raise PersonNotFoundError('person with twitter nick ' + str(id_or_nick) + ' not found')
         else:
             raise ValueError('unknown context: ' + str(context))
@@ -339,9 +484,10 @@ class Person:
             raise PersonNotFoundError('person with id ' + str(self.id) + ' not found')
     
     def set_option(self, option_name, value):
-        opts = self.options
-        opts[option_name] = value
-        self.options = opts
+        with transaction():
+            opts = dict(self.options)
+            opts[option_name] = value
+            self.options = opts
     
     @property
     def status(self):
@@ -399,7 +545,7 @@ class Person:
 
 def everyone():
     for person in config():
-        if id in person:
+        if 'id' in person:
             yield Person(person['id'])
 
 def sub(nick, source, target, strict=True, exit_on_fail=False, twitter_at_prefix=True):
@@ -422,29 +568,99 @@ def sub(nick, source, target, strict=True, exit_on_fail=False, twitter_at_prefix
         except PersonNotFoundError:
             return nick
 
-def textsub(text, source, target, strict=False):
-    def _nicksForContext(context):
-        if context == 'irc':
+class _Substituter:
+    """Replaces nicks from one context with the same people's nicks in another context, for textsub.
+    
+    Semantically, each nick is replaced in order with a separate regex substitution, so a replacement can itself be replaced by a later nick. All patterns are compiled once. As long as no two nicks or replacements can overlap in a text (see _overlap), the same result is computed in a single pass over the text, with a table that maps each nick to its final replacement.
+    """
+    def __init__(self, source, target, strict):
+        if source == 'irc':
             mode = 'main' if strict else 'all'
-            return reversed(list(ircNicks(include_ids=True, mode=mode)))
-        elif context == 'minecraft':
-            return minecraftNicks(include_ids=True)
-        elif context == 'reddit':
-            return redditNicks(include_ids=True)
-        elif context == 'twitter':
-            return twitterNicks(include_ids=True, twitter_at_prefix=True)
+            nicks = list(reversed(list(ircNicks(include_ids=True, mode=mode))))
+        elif source == 'minecraft':
+            nicks = list(minecraftNicks(include_ids=True))
+        elif source == 'reddit':
+            nicks = list(redditNicks(include_ids=True))
+        elif source == 'twitter':
+            nicks = list(twitterNicks(include_ids=True, twitter_at_prefix=True))
         else:
-            return []
-    
-    text = text[:]
-    for id, nick in _nicksForContext(source):
-        if Person(id).nick(target):
-            text = re.sub('(?<![0-9A-Za-z@])(' + re.sub('\\|', '\\|', nick) + ')(?![0-9A-Za-z])', Person(id).nick(target, twitter_at_prefix=True), text, flags=re.IGNORECASE)
-    if not strict:
-        for id, nick in otherNicks(include_ids=True, mode='all'):
-            if Person(id).nick(target):
-                text = re.sub('(?<![0-9A-Za-z@])(' + re.sub('\\|', '\\|', nick) + ')(?![0-9A-Za-z])', Person(id).nick(target, twitter_at_prefix=True), text, flags=re.IGNORECASE)
-    return text
+            nicks = []
+        if not strict:
+            nicks += list(otherNicks(include_ids=True, mode='all'))
+        self.substitutions = [] # (nick, compiled pattern, replacement) in the order they are applied
+        for id, nick in nicks:
+            person = Person(id)
+            if person.nick(target):
+                self.substitutions.append((nick, re.compile('(?<![0-9A-Za-z@])(' + re.sub('\\|', '\\|', nick) + ')(?![0-9A-Za-z])', flags=re.IGNORECASE), person.nick(target, twitter_at_prefix=True)))
+        try:
+            # matches wherever any of the patterns matches, so texts without any nicks can be returned unchanged after one search
+            self.regex = re.compile('(?<![0-9A-Za-z@])(' + '|'.join(re.sub('\\|', '\\|', nick) for nick in sorted(set(nick for nick, pattern, replacement in self.substitutions), key=len, reverse=True)) + ')(?![0-9A-Za-z])', flags=re.IGNORECASE) if len(self.substitutions) else None
+        except re.error:
+            self.regex = None
+        self.table = self._table()
+    
+    @staticmethod
+    def _overlap(tokens, nicks):
+        """Returns True if one of the tokens (nicks and replacements) could start or end inside another one in a text, where at least one of them is a nick."""
+        prefixes = {}
+        for token in tokens:
+            for length in range(1, len(token)):
+                prefixes.setdefault(token[:length], set()).add(token)
+        for token in tokens:
+            for start in range(len(token)):
+                if start > 0 and token[start - 1].isalnum():
+                    continue # no match can start here
+                for end in range(start + 1, len(token) + 1):
+                    other = token[start:end]
+                    if other != token and (other in nicks or token in nicks) and other in tokens and (end == len(token) or not token[end].isalnum()):
+                        return True # a token inside another
+                if start > 0:
+                    for other in prefixes.get(token[start:], ()):
+                        if other != token and (token in nicks or other in nicks):
+                            return True # a token ending inside another
+        return False
+    
+    def _table(self):
+        """Returns a dict mapping each lowercased nick to its final replacement, or None if the single pass might not give the same result as applying the substitutions in order."""
+        nicks = set(nick.lower() for nick, pattern, replacement in self.substitutions)
+        tokens = nicks | set(replacement.lower() for nick, pattern, replacement in self.substitutions)
+        for nick, pattern, replacement in self.substitutions:
+            if nick == '' or re.search('[^\\x20-\\x7e]|[.^$*+?{}\\[\\]\\\\()]', nick) or not nick[0].isalnum() or not nick[-1].isalnum():
+                return None # the pattern isn't just the nick, or its boundaries don't work like the ones of the other nicks
+            if re.search('[^\\x20-\\x7e]|\\\\', replacement):
+                return None # the replacement isn't used literally
+        if self.regex is None or self._overlap(tokens, nicks):
+            return None
+        table = {}
+        for nick in nicks:
+            text = nick
+            for substitution_nick, pattern, replacement in self.substitutions:
+                if substitution_nick.lower() == text.lower():
+                    text = replacement
+            table[nick] = text
+        return table
+    
+    def sub(self, text):
+        if self.regex is None:
+            if len(self.substitutions) == 0:
+                return text
+        elif not self.regex.search(text):
+            return text
+        if self.table is not None:
+            try:
+                return self.regex.sub(lambda match: self.table[match.group(1).lower()], text)
+            except KeyError:
+                pass # matched a non-ASCII character that isn't the same when lowercased, fall back to the separate substitutions
+        for nick, pattern, replacement in self.substitutions:
+            text = pattern.sub(replacement, text)
+        return text
+
+def textsub(text, source, target, strict=False):
+    substituters = _people_snapshot()['substituters']
+    key = source, target, bool(strict)
+    if key not in substituters:
+        substituters[key] = _Substituter(source, target, strict)
+    return substituters[key].sub(text)
 
 if __name__ == '__main__':
     if arguments['NICK']:
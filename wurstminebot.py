@@ -3,13 +3,18 @@
 
 Usage:
   wurstminebot [options] [start | stop | restart | status]
+  wurstminebot [options] replay (<logfile> | --synthetic=<lines>)
   wurstminebot -h | --help
   wurstminebot --version
 
 Options:
-  -h, --help         Print this message and exit.
-  --config=<config>  Path to the config file [default: /opt/wurstmineberg/config/wurstminebot.json].
-  --version          Print version info and exit.
+  -h, --help           Print this message and exit.
+  --asyncio            Run the log input, the hourly time announcement, timers, and the IRC connection on an asyncio event loop instead of separate threads. Requires Python 3.7 or later.
+  --config=<config>    Path to the config file [default: /opt/wurstmineberg/config/wurstminebot.json].
+  --mix=<mix>          Kinds of log lines generated by --synthetic, as comma-separated type=weight pairs [default: chat=80,action=2,command=2,join=4,leave=4,death=3,achievement=1,other=4].
+  --rate=<rate>        Lines per second to replay, 0 to replay as fast as possible [default: 0].
+  --synthetic=<lines>  Replay this many generated log lines instead of a recorded log.
+  --version            Print version info and exit.
 """
 
 import sys
@@ -17,11 +22,15 @@ import sys
 sys.path.append('/opt/py')
 
 from TwitterAPI import TwitterAPI
+import collections
+import concurrent.futures
+import copy
 import daemon
 import daemon.pidlockfile
 from datetime import datetime
 import deaths
 from docopt import docopt
+import httpclient
 from ircbotframe import ircBot
 import json
 import lockfile
@@ -29,13 +38,17 @@ import minecraft
 import nicksub
 import os
 import os.path
+import queue
 import random
 import re
 import requests
 import select
+import shutil
 import signal
 import socket
+import struct
 import subprocess
+import tempfile
 import threading
 import time
 from cobe.brain import Brain
@@ -46,28 +59,186 @@ import xml.sax.saxutils
 __version__ = nicksub.__version__
 
 CONFIG_FILE = '/opt/wurstmineberg/config/wurstminebot.json'
+USE_ASYNCIO = False
 if __name__ == '__main__':
     arguments = docopt(__doc__, version='wurstminebot ' + __version__)
     CONFIG_FILE = arguments['--config']
+    USE_ASYNCIO = arguments['--asyncio']
 
 
 def _debug_print(msg):
     if config('debug', False):
         print('DEBUG] ' + msg)
 
-def _logtail(timeout=0.5):
+class _LogWatcher:
+    """Waits for changes to a log file using inotify on its directory.
+    
+    If inotify is not available (not on Linux, or the watch can't be added), wait falls back to sleeping for the given timeout.
+    """
+    IN_MODIFY = 0x00000002
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_NONBLOCK = 0o00004000
+    IN_CLOEXEC = 0o02000000
+    
+    def __init__(self, logpath):
+        self.filename = os.path.basename(logpath).encode('utf-8')
+        self.fd = None
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+            mask = self.IN_MODIFY | self.IN_CREATE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_DELETE | self.IN_MOVE_SELF | self.IN_DELETE_SELF
+            if libc.inotify_add_watch(fd, os.path.dirname(logpath).encode('utf-8'), mask) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+        except (AttributeError, ImportError, OSError):
+            _debug_print('inotify unavailable, polling the server log')
+        else:
+            self.fd = fd
+    
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+    
+    def read_events(self):
+        """Reads the pending inotify events without blocking, and returns whether the log may have changed. If the log directory went away, the watcher is closed and True is returned."""
+        try:
+            data = os.read(self.fd, 65536)
+        except OSError:
+            return False # spurious wakeup, nothing to read
+        offset = 0
+        relevant = False
+        while offset < len(data):
+            wd, mask, cookie, name_len = struct.unpack_from('iIII', data, offset)
+            name = data[offset + 16:offset + 16 + name_len].rstrip(b'\0')
+            offset += 16 + name_len
+            if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF | self.IN_IGNORED):
+                _debug_print('log directory went away, polling the server log')
+                self.close()
+                return True
+            if mask & self.IN_Q_OVERFLOW or name == self.filename:
+                relevant = True
+        return relevant
+    
+    def wait(self, timeout):
+        """Blocks until the log may have changed. With inotify, this ignores timeout and doesn't wake up while the log is idle."""
+        if self.fd is None:
+            time.sleep(timeout)
+            return
+        while True:
+            select.select([self.fd], [], [])
+            if self.read_events():
+                return
+
+def _logtail(timeout=0.5, block=True):
+    """Yields lines appended to the server log, starting at its current end.
+    
+    Only the bytes written since the last poll are read. An incomplete last line is kept back until its newline arrives. When the log is rotated (the path now refers to a different inode) or truncated (it got smaller than what has been read), the rest of the old file is read before continuing at the start of the new one, so no lines are lost or yielded twice.
+    
+    The log is watched with inotify where available, so new lines are yielded right away. Otherwise, it is polled every timeout seconds.
+    
+    If block is False, the generator doesn't wait for the log to change. Instead, it yields the _LogWatcher, and the caller has to wait until the log may have changed (or for timeout seconds if the watcher's fd is None) before getting the next item. This is used by the asyncio mode in aiocore.
+    """
     logpath = os.path.join(config('paths')['minecraft_server'], 'logs', 'latest.log')
-    with open(logpath) as log:
-        lines_read = len(list(log.read().split('\n'))) - 1 # don't yield lines that already existed
-    while True:
-        time.sleep(timeout)
-        with open(logpath) as log:
-            lines = log.read().split('\n')
-            if len(lines) <= lines_read: # log has restarted
-                lines_read = 0
-            for line in lines[lines_read:-1]:
-                lines_read += 1
-                yield line
+    watcher = _LogWatcher(logpath)
+    
+    def _wait():
+        if block:
+            watcher.wait(timeout)
+        else:
+            yield watcher
+    
+    def _open():
+        while True:
+            try:
+                log = open(logpath, 'rb')
+            except IOError:
+                # the server is starting a new log, try again
+                if block:
+                    time.sleep(timeout)
+                else:
+                    yield watcher
+            else:
+                return log, os.fstat(log.fileno()).st_ino
+    
+    log, inode = yield from _open()
+    log.seek(0, os.SEEK_END) # don't yield lines that already existed
+    partial = b''
+    reopened = False
+    try:
+        while True:
+            if not reopened:
+                yield from _wait()
+            reopened = False
+            data = log.read()
+            if data:
+                lines = (partial + data).split(b'\n')
+                partial = lines.pop()
+                for line in lines:
+                    yield line.decode('utf-8', errors='replace')
+            try:
+                stat = os.stat(logpath)
+            except OSError:
+                continue # the log has been moved away but the new one doesn't exist yet
+            if stat.st_ino != inode or stat.st_size < log.tell():
+                # log has been rotated or truncated, drain the old file and start over
+                data = log.read()
+                lines = (partial + data).split(b'\n')
+                if lines[-1] == b'':
+                    lines.pop()
+                for line in lines:
+                    yield line.decode('utf-8', errors='replace')
+                partial = b''
+                log.close()
+                log, inode = yield from _open()
+                reopened = True # read the new log right away, its lines may have been written before the watcher was notified
+    finally:
+        log.close()
+        watcher.close()
+
+_config_cache = {
+    'checked': 0.0, # when the config file was last checked for changes
+    'config': None, # the parsed config file, or None if it couldn't be loaded
+    'stat': None # the (mtime, size) of the config file when it was loaded
+}
+_config_lock = threading.Lock()
+
+def _config_snapshot(reload=False):
+    """Returns the parsed config file from memory. The file is checked for changes at most once a second, and only parsed again if its mtime or size changed."""
+    with _config_lock:
+        now = time.time()
+        if reload or now - _config_cache['checked'] >= 1.0:
+            _config_cache['checked'] = now
+            try:
+                stat = os.stat(CONFIG_FILE)
+                file_stat = (stat.st_mtime, stat.st_size)
+            except OSError:
+                file_stat = None
+            if reload or file_stat is None or file_stat != _config_cache['stat']:
+                try:
+                    with open(CONFIG_FILE) as config_file:
+                        _config_cache['config'] = json.load(config_file)
+                except:
+                    _config_cache['config'] = None
+                _config_cache['stat'] = file_stat
+        return _config_cache['config']
+
+def _copy_config_value(value):
+    return copy.deepcopy(value) if isinstance(value, (dict, list)) else value # callers may modify the returned value, so don't hand out the cached one
+
+def reload_config():
+    _config_snapshot(reload=True)
 
 def config(key=None, default_value=None):
     default_config = {
@@ -111,18 +282,21 @@ def config(key=None, default_value=None):
             'screen_name': 'wurstmineberg'
         }
     }
-    try:
-        with open(CONFIG_FILE) as config_file:
-            j = json.load(config_file)
-    except:
+    j = _config_snapshot()
+    if j is None:
         j = default_config
     if key is None:
-        return j
-    return j.get(key, default_config.get(key)) if default_value is None else j.get(key, default_value)
+        return _copy_config_value(j)
+    return _copy_config_value(j.get(key, default_config.get(key)) if default_value is None else j.get(key, default_value))
 
 def set_config(config_dict):
-    with open(CONFIG_FILE, 'w') as config_file:
-        json.dump(config_dict, config_file, sort_keys=True, indent=4, separators=(',', ': '))
+    with _config_lock:
+        with open(CONFIG_FILE, 'w') as config_file:
+            json.dump(config_dict, config_file, sort_keys=True, indent=4, separators=(',', ': '))
+        stat = os.stat(CONFIG_FILE)
+        _config_cache['checked'] = time.time()
+        _config_cache['config'] = copy.deepcopy(config_dict)
+        _config_cache['stat'] = (stat.st_mtime, stat.st_size)
 
 def update_config(path, value):
     config_dict = config()
@@ -140,6 +314,228 @@ def update_config(path, value):
         full_config_dict = value
     set_config(full_config_dict)
 
+_known_players = {
+    'inode': None, # the inode of logins.log when it was last read
+    'logs': None, # the logs directory the index was built from
+    'offset': 0, # how many bytes of logins.log have been read
+    'players': {}, # maps each player who ever joined or left to [first timestamp, last timestamp], as written in logins.log
+    'saved': 0.0 # when the index was last saved to knownplayers.json
+}
+_known_players_lock = threading.Lock()
+
+def _parse_login_line(line):
+    """Parses a line from logins.log, like “<timestamp> <player> joined the game”. Returns a (timestamp, player) pair, or None for other lines."""
+    for suffix in (' joined the game', ' left the game'):
+        if line.endswith(suffix):
+            timestamp, _, player = line[:-len(suffix)].rpartition(' ')
+            if player:
+                return timestamp, player
+    return None
+
+def _known_players_update():
+    """Brings the known players index up to date with logins.log, reading only what was appended since the last call.
+    
+    The index is saved to knownplayers.json next to logins.log together with the offset up to which logins.log was read, so that it only has to be read from the beginning once. It is saved when a new player shows up, and otherwise at most once a minute, since anything after the saved offset is read again on startup anyway.
+    """
+    logs = config('paths')['logs']
+    loginslog_path = os.path.join(logs, 'logins.log')
+    sidecar_path = os.path.join(logs, 'knownplayers.json')
+    with _known_players_lock:
+        if _known_players['logs'] != logs:
+            _known_players['inode'] = None
+            _known_players['logs'] = logs
+            _known_players['offset'] = 0
+            _known_players['players'] = {}
+            _known_players['saved'] = time.time()
+            try:
+                with open(sidecar_path) as sidecar:
+                    saved = json.load(sidecar)
+                _known_players['inode'] = saved['inode']
+                _known_players['offset'] = saved['offset']
+                _known_players['players'] = saved['players']
+            except (IOError, OSError, KeyError, ValueError):
+                pass
+        try:
+            stat = os.stat(loginslog_path)
+        except OSError:
+            return
+        if stat.st_ino != _known_players['inode'] or stat.st_size < _known_players['offset']:
+            # logins.log was replaced or truncated, read it from the beginning
+            _known_players['inode'] = stat.st_ino
+            _known_players['offset'] = 0
+            _known_players['players'] = {}
+        if stat.st_size == _known_players['offset']:
+            return
+        with open(loginslog_path, 'rb') as loginslog:
+            loginslog.seek(_known_players['offset'])
+            data = loginslog.read()
+        end = data.rfind(b'\n') + 1 # a partially written last line is read next time
+        if end == 0:
+            return
+        new_player = False
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            parsed = _parse_login_line(line.rstrip('\r'))
+            if parsed is None:
+                continue
+            timestamp, player = parsed
+            if player in _known_players['players']:
+                _known_players['players'][player][1] = timestamp
+            else:
+                _known_players['players'][player] = [timestamp, timestamp]
+                new_player = True
+        _known_players['offset'] += end
+        if not new_player and time.time() - _known_players['saved'] < 60:
+            return
+        _known_players['saved'] = time.time()
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=logs, prefix='.knownplayers.', suffix='.tmp', delete=False) as sidecar:
+                json.dump({
+                    'inode': _known_players['inode'],
+                    'offset': _known_players['offset'],
+                    'players': _known_players['players']
+                }, sidecar, separators=(',', ':'))
+            os.rename(sidecar.name, sidecar_path)
+        except (IOError, OSError):
+            pass # the index is rebuilt from logins.log if the sidecar file is missing or outdated
+
+def known_player(player):
+    """Returns the first and last timestamps in logins.log for this player as a tuple, or None if the player has never been on the server."""
+    _known_players_update()
+    with _known_players_lock:
+        if player in _known_players['players']:
+            return tuple(_known_players['players'][player])
+    return None
+
+_last_seen = {
+    'backfilled': False, # whether the table has been filled from the server logs, see _last_seen_backfill
+    'logs': None, # the logs directory the table was loaded from
+    'players': {} # maps Minecraft nicks to when they were last seen on the server, as UTC datetimes
+}
+_last_seen_lock = threading.Lock()
+
+def _last_seen_load():
+    """Loads the last-seen table from lastseen.json in the logs directory, unless it is already loaded. Must be called with _last_seen_lock held."""
+    logs = config('paths')['logs']
+    if _last_seen['logs'] == logs:
+        return
+    _last_seen['backfilled'] = False
+    _last_seen['logs'] = logs
+    _last_seen['players'] = {}
+    try:
+        with open(os.path.join(logs, 'lastseen.json')) as lastseen_file:
+            saved = json.load(lastseen_file)
+        _last_seen['backfilled'] = saved['backfilled']
+        _last_seen['players'] = dict((player, datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')) for player, timestamp in saved['players'].items())
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+
+def _last_seen_save():
+    """Saves the last-seen table to lastseen.json in the logs directory. Must be called with _last_seen_lock held."""
+    try:
+        with tempfile.NamedTemporaryFile('w', dir=_last_seen['logs'], prefix='.lastseen.', suffix='.tmp', delete=False) as lastseen_file:
+            json.dump({
+                'backfilled': _last_seen['backfilled'],
+                'players': dict((player, timestamp.strftime('%Y-%m-%d %H:%M:%S')) for player, timestamp in _last_seen['players'].items())
+            }, lastseen_file, sort_keys=True, indent=4, separators=(',', ': '))
+        os.rename(lastseen_file.name, os.path.join(_last_seen['logs'], 'lastseen.json'))
+    except (IOError, OSError):
+        pass
+
+def _last_seen_backfill():
+    """Fills the last-seen table from the server logs, for all players in people.json or logins.log. This only has to be done once, after that the table is kept up to date by the join and leave events."""
+    with _last_seen_lock:
+        _last_seen_load()
+        if _last_seen['backfilled']:
+            return
+    _known_players_update()
+    with _known_players_lock:
+        players = set(_known_players['players'])
+    players.update(nicksub.minecraftNicks())
+    for player in sorted(players):
+        with LOGLOCK: # one player at a time, so lastseen commands aren't blocked for the whole backfill
+            timestamp = minecraft.last_seen(player)
+        if timestamp is None:
+            continue
+        with _last_seen_lock:
+            if player not in _last_seen['players'] or _last_seen['players'][player] < timestamp:
+                _last_seen['players'][player] = timestamp
+    with _last_seen_lock:
+        _last_seen['backfilled'] = True
+        _last_seen_save()
+
+def last_seen(player):
+    """Returns when the player was last seen on the server as a UTC datetime, or None if they have never been on it.
+    
+    Until the backfill has run, players who are not in the table yet are looked up in the server logs.
+    """
+    with _last_seen_lock:
+        _last_seen_load()
+        if player in _last_seen['players']:
+            return _last_seen['players'][player]
+        if _last_seen['backfilled']:
+            return None
+    with LOGLOCK:
+        timestamp = minecraft.last_seen(player)
+    if timestamp is not None:
+        with _last_seen_lock:
+            if player not in _last_seen['players'] or _last_seen['players'][player] < timestamp:
+                _last_seen['players'][player] = timestamp
+    return timestamp
+
+def record_last_seen(player, timestamp=None):
+    """Records that the player is on the server now (or at the given UTC datetime), and saves the last-seen table."""
+    if timestamp is None:
+        timestamp = datetime.utcnow().replace(microsecond=0)
+    with _last_seen_lock:
+        _last_seen_load()
+        _last_seen['players'][player] = timestamp
+        _last_seen_save()
+
+_online_players = {
+    'players': [], # the Minecraft nicks of the players who are online, in the order they joined
+    'reconciled': None # when the list was last checked against the server, None if it has to be checked before it's used again
+}
+_online_players_lock = threading.Lock()
+
+def online_players():
+    """Returns the Minecraft nicks of the players who are currently online.
+    
+    The list is kept up to date by the join and leave events from the server log, and checked against the server every 5 minutes, or when it has been invalidated using invalidate_online_players.
+    """
+    with _online_players_lock:
+        if _online_players['reconciled'] is None or time.time() - _online_players['reconciled'] >= 300:
+            _online_players['players'] = list(minecraft.online_players())
+            _online_players['reconciled'] = time.time()
+        return list(_online_players['players'])
+
+def invalidate_online_players():
+    """Makes the next online_players call ask the server, for example after a restart."""
+    with _online_players_lock:
+        _online_players['reconciled'] = None
+
+def _online_players_event(player, joined):
+    with _online_players_lock:
+        if joined:
+            if player not in _online_players['players']:
+                _online_players['players'].append(player)
+        elif player in _online_players['players']:
+            _online_players['players'].remove(player)
+
+_death_store = {
+    'path': None,
+    'store': None
+}
+_death_store_lock = threading.Lock()
+
+def death_store():
+    """Returns the deaths.DeathStore for the configured database path (paths.deathsdb, by default deaths.sqlite in the logs directory)."""
+    path = config('paths').get('deathsdb', os.path.join(config('paths')['logs'], 'deaths.sqlite'))
+    with _death_store_lock:
+        if _death_store['path'] != path:
+            _death_store['store'] = deaths.DeathStore(path)
+            _death_store['path'] = path
+        return _death_store['store']
+
 ACHIEVEMENTTWEET = True
 DEATHTWEET = True
 DST = bool(time.localtime().tm_isdst)
@@ -151,7 +547,21 @@ bot = ircBot(config('irc')['server'], config('irc')['port'], config('irc')['nick
 bot.log_own_messages = False
 brain=Brain(config('paths').get('cobebrain'))
 
-twitter = TwitterAPI(config('twitter')['consumer_key'], config('twitter')['consumer_secret'], config('twitter')['access_token_key'], config('twitter')['access_token_secret'])
+class TwitterClient:
+    """Makes Twitter REST API requests using the shared HTTP client, so they have a timeout and count towards api.twitter.com's circuit breaker. TwitterAPI is only used for signing the requests."""
+    GET_RESOURCES = ['statuses/show'] # the other resources used by the bot are POST
+    
+    def __init__(self, api):
+        self.auth = api.auth
+    
+    def request(self, resource, params=None):
+        url = 'https://api.twitter.com/1.1/' + resource + '.json'
+        if resource in self.GET_RESOURCES:
+            return httpclient.request('GET', url, params=params, auth=self.auth)
+        else:
+            return httpclient.request('POST', url, data=params, auth=self.auth)
+
+twitter = TwitterClient(TwitterAPI(config('twitter')['consumer_key'], config('twitter')['consumer_secret'], config('twitter')['access_token_key'], config('twitter')['access_token_secret']))
 
 class errors:
     log = "I can't find that in my chatlog"
@@ -182,11 +592,54 @@ class errors:
 
 permission_levels = [None, 'sender must be in people.json', 'requires invite', 'whitelisted only', 'bot-ops only']
 
+Timer = threading.Timer # used for all delayed actions, replaced by aiocore.LoopTimer in asyncio mode
+
+class CoalescingTimer:
+    """Runs a function once, a given number of seconds after it was first requested. Further requests before then are merged into that run. Requests made while the function is running schedule another run."""
+    def __init__(self, delay, function):
+        self.delay = delay
+        self.function = function
+        self.lock = threading.Lock()
+        self.runs = 0
+        self.requests = 0
+        self.timer = None
+    
+    def _run(self):
+        with self.lock:
+            self.timer = None
+        self.runs += 1
+        try:
+            self.function()
+        except Exception:
+            _debug_print('Exception in coalesced ' + getattr(self.function, '__name__', 'function') + ':')
+            if config('debug', False):
+                traceback.print_exc()
+    
+    def request(self):
+        with self.lock:
+            self.requests += 1
+            if self.timer is None:
+                self.timer = Timer(self.delay, self._run)
+                self.timer.daemon = True
+                self.timer.start()
+
+def _update_status_later():
+    minecraft.update_status() # again, since the server might not have been done saving the world when it was updated first
+
+def _update_status_whitelist_topic():
+    minecraft.update_status()
+    minecraft.update_whitelist()
+    update_topic()
+    update_status_later.request()
+
+update_all_later = CoalescingTimer(2, _update_status_whitelist_topic) # for join/leave storms, see update_all
+update_status_later = CoalescingTimer(20, _update_status_later)
+
 def update_all(*args, **kwargs):
     minecraft.update_status()
     minecraft.update_whitelist()
     update_topic(force='reply' in kwargs) # force-update the topic if called from fixstatus command
-    threading.Timer(20, minecraft.update_status).start()
+    update_status_later.request()
 
 class TwitterError(Exception):
     def __init__(self, code, message=None, status_code=0):
@@ -205,16 +658,394 @@ def tweet(status):
     first_error = j.get('errors', [])[0] if len(j.get('errors', [])) else {}
     raise TwitterError(first_error.get('code', 0), message=first_error.get('message'), status_code=r.status_code)
 
-def pastetweet(status, link=False, tellraw=False):
+class TweetQueue(threading.Thread):
+    """Sends tweets on a background thread, so that the log input loop doesn't wait for Twitter.
+    
+    Tweets which fail with a server error (5xx), because of rate limiting (429), or because Twitter can't be reached are retried with exponential backoff.
+    """
+    def __init__(self, maxsize=100, max_attempts=5):
+        super().__init__(name='wurstminebot TweetQueue')
+        self.daemon = True
+        self.latencies = collections.deque(maxlen=100) # seconds from put to sent, for the most recent tweets
+        self.max_attempts = max_attempts
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.sent = 0
+        self.failed = 0
+        self.stopped = False
+    
+    def put(self, status, callback=None):
+        """Queues a tweet. When it has been sent or has failed for good, callback (if given) is called on the queue's thread with the tweet id and None, or with None and the TwitterError."""
+        try:
+            self.queue.put_nowait((status, callback, time.time()))
+        except queue.Full:
+            self.failed += 1
+            if callback is not None:
+                callback(None, TwitterError(0, message='too many tweets queued'))
+    
+    def _send(self, status):
+        delay = 1
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+            try:
+                return tweet(status), None
+            except TwitterError as e:
+                error = e
+                if e.status_code != 429 and e.status_code < 500:
+                    break
+            except requests.exceptions.RequestException as e:
+                error = TwitterError(0, message=str(e))
+        return None, error
+    
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None: # put by stop, after all the tweets queued before it
+                break
+            status, callback, queued = item
+            try:
+                twid, error = self._send(status)
+            except Exception as e: # e.g. a response which isn't JSON, don't let it kill the queue
+                _debug_print('Exception while tweeting:')
+                if config('debug', False):
+                    traceback.print_exc()
+                twid, error = None, TwitterError(0, message=str(e))
+            if error is None:
+                self.sent += 1
+                self.latencies.append(time.time() - queued)
+            else:
+                self.failed += 1
+            if callback is not None:
+                try:
+                    callback(twid, error)
+                except Exception:
+                    _debug_print('Exception in tweet callback:')
+                    if config('debug', False):
+                        traceback.print_exc()
+            self.queue.task_done()
+    
+    def start(self):
+        self.stopped = False
+        super().start()
+    
+    def stats(self):
+        """Returns a dict with the number of queued, sent, and failed tweets, and the average and maximum latency in seconds of recent tweets."""
+        latencies = list(self.latencies)
+        return {
+            'failed': self.failed,
+            'latency_avg': sum(latencies) / len(latencies) if len(latencies) else 0.0,
+            'latency_max': max(latencies) if len(latencies) else 0.0,
+            'queued': self.queue.qsize(),
+            'sent': self.sent
+        }
+    
+    def stop(self, timeout=30):
+        """Stops the queue after sending the tweets which are still queued, waiting for at most timeout seconds."""
+        if self.is_alive() and not self.stopped:
+            self.stopped = True
+            self.queue.put(None)
+            self.join(timeout)
+
+TweetQueue = TweetQueue()
+
+class IRCQueue(threading.Thread):
+    """Sends IRC messages with flood control, so the bot doesn't get kicked for sending too much at once.
+    
+    Messages are sent at most rate per second on average, with bursts of up to burst messages (a token bucket). Each message is in one of three lanes, which are sent in order of priority: 'relay' (chat relayed from Minecraft, deaths, and other server events), 'normal', and 'bulk' (command replies and pastes). While the bot is close to the flood limit, consecutive short messages in the same lane to the same target are merged into one line.
+    """
+    LANES = ('relay', 'normal', 'bulk')
+    
+    def __init__(self, rate=1.0, burst=4, merge_length=400):
+        super().__init__(name='wurstminebot IRCQueue')
+        self.daemon = True
+        self.burst = burst
+        self.condition = threading.Condition()
+        self.in_flight = False
+        self.lanes = dict((lane, collections.deque()) for lane in self.LANES) # each message is a (target, text, time queued) tuple
+        self.latencies = dict((lane, collections.deque(maxlen=100)) for lane in self.LANES) # seconds from say to sent, for the most recent messages
+        self.merge_length = merge_length
+        self.merged = 0
+        self.rate = rate
+        self.sent = 0
+        self.stopped = False
+        self.tokens = burst
+        self.tokens_updated = time.time()
+    
+    def _next(self):
+        """Removes the next message to be sent from its lane and returns it with the lane, merging it with the messages after it if necessary. Must be called with the condition held."""
+        for lane in self.LANES:
+            if len(self.lanes[lane]):
+                break
+        else:
+            return None
+        target, text, queued = self.lanes[lane].popleft()
+        if self.tokens < 2: # close to the limit, try to save a line
+            while len(self.lanes[lane]) and self.lanes[lane][0][0] == target and len(text) + len(' | ') + len(self.lanes[lane][0][1]) <= self.merge_length:
+                text += ' | ' + self.lanes[lane].popleft()[1]
+                self.merged += 1
+        return lane, target, text, queued
+    
+    def flush(self, timeout=10):
+        """Waits until all queued messages have been sent, or timeout seconds have passed."""
+        if not self.is_alive():
+            return
+        deadline = time.time() + timeout
+        with self.condition:
+            while (self.in_flight or any(len(messages) for messages in self.lanes.values())) and time.time() < deadline:
+                self.condition.wait(max(deadline - time.time(), 0))
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    now = time.time()
+                    self.tokens = min(self.burst, self.tokens + (now - self.tokens_updated) * self.rate)
+                    self.tokens_updated = now
+                    pending = any(len(messages) for messages in self.lanes.values())
+                    if not pending:
+                        if self.stopped:
+                            return
+                        self.condition.wait()
+                    elif self.tokens < 1:
+                        self.condition.wait((1 - self.tokens) / self.rate)
+                    else:
+                        break
+                lane, target, text, queued = self._next()
+                self.tokens -= 1
+                self.in_flight = True
+            try:
+                bot.say(target, text)
+            except Exception:
+                _debug_print('Exception while sending to ' + str(target) + ':')
+                if config('debug', False):
+                    traceback.print_exc()
+            with self.condition:
+                self.in_flight = False
+                self.latencies[lane].append(time.time() - queued)
+                self.sent += 1
+                self.condition.notify_all()
+    
+    def say(self, target, text, lane='normal'):
+        """Queues a message. If the queue isn't running, it is sent right away."""
+        if not self.is_alive() or self.stopped:
+            bot.say(target, text)
+            return
+        with self.condition:
+            self.lanes[lane].append((target, text, time.time()))
+            self.condition.notify_all()
+    
+    def start(self):
+        self.stopped = False
+        super().start()
+    
+    def stats(self):
+        """Returns a dict with the number of sent and merged messages, and for each lane the number of queued messages and the average latency in seconds of recent messages."""
+        with self.condition:
+            return {
+                'lanes': dict((lane, {
+                    'latency_avg': sum(self.latencies[lane]) / len(self.latencies[lane]) if len(self.latencies[lane]) else 0.0,
+                    'queued': len(self.lanes[lane])
+                }) for lane in self.LANES),
+                'merged': self.merged,
+                'sent': self.sent
+            }
+    
+    def stop(self, timeout=10):
+        """Stops the queue after sending the messages which are still queued, waiting for at most timeout seconds."""
+        if self.is_alive() and not self.stopped:
+            with self.condition:
+                self.stopped = True
+                self.condition.notify_all()
+            self.join(timeout)
+
+IRCQueue = IRCQueue()
+
+class TTLCache:
+    """A thread-safe dict-like cache with a maximum size and a time to live. When the cache is full, the least recently used entry is dropped."""
+    def __init__(self, maxsize=256, ttl=300):
+        self.data = collections.OrderedDict() # maps keys to (expiry time, value), least recently used first
+        self.lock = threading.Lock()
+        self.maxsize = maxsize
+        self.ttl = ttl
+    
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+    
+    def __getitem__(self, key):
+        with self.lock:
+            expires, value = self.data[key]
+            if expires < time.time():
+                del self.data[key]
+                raise KeyError(key)
+            self.data.move_to_end(key)
+            return value
+    
+    def __len__(self):
+        return len(self.data)
+    
+    def __setitem__(self, key, value):
+        self.set(key, value)
+    
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def set(self, key, value, ttl=None):
+        """Stores a value, optionally with a different time to live than the cache's default."""
+        with self.lock:
+            if key in self.data:
+                del self.data[key]
+            self.data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+class ConsolePipeline(threading.Thread):
+    """Collects tellraw commands for a few milliseconds, then writes them to the server console on the pipeline's thread, so the caller doesn't wait for the console.
+    
+    Each tellraw is still written with its own minecraft.tellraw call, in the order they were sent. Consecutive tellraws of the same message to different players are merged into one tellraw to @a if they cover every player who is online. If the console can't be reached, a warning is posted to IRC.
+    """
+    def __init__(self, window=0.005):
+        super().__init__(name='wurstminebot ConsolePipeline')
+        self.daemon = True
+        self.batched = 0
+        self.batches = 0
+        self.disconnected = False
+        self.max_batch = 0
+        self.queue = queue.Queue()
+        self.requested = 0
+        self.started = time.time()
+        self.stopped = False
+        self.window = window
+        self.written = 0
+    
+    def _tellraw(self, message, player):
+        try:
+            minecraft.tellraw(message, player)
+        except socket.error:
+            if not self.disconnected: # only warn once until the console is back
+                self.disconnected = True
+                IRCQueue.say(config('irc').get('main_channel', '#wurstmineberg'), 'Warning: the bot is disconnected from the Minecraft console')
+        except Exception:
+            _debug_print('Exception in tellraw to ' + str(player) + ':')
+            if config('debug', False):
+                traceback.print_exc()
+        else:
+            self.disconnected = False
+            self.written += 1
+    
+    def _write(self, batch):
+        groups = [] # runs of the same message to different players, as (message, JSON of message, players) tuples, in the order they were sent
+        for message, player in batch:
+            key = json.dumps(message, sort_keys=True)
+            if len(groups) and groups[-1][1] == key and player not in groups[-1][2]:
+                groups[-1][2].append(player)
+            else:
+                groups.append((message, key, [player]))
+        online = None
+        for message, key, players in groups:
+            if len(players) > 1 and '@a' not in players:
+                if online is None:
+                    online = set(online_players())
+                if len(online) and online <= set(players):
+                    players = ['@a']
+            for player in players:
+                self._tellraw(message, player)
+        self.batched += len(batch)
+        self.batches += 1
+        self.max_batch = max(self.max_batch, len(batch))
+    
+    def flush(self):
+        """Waits until everything sent so far has been written."""
+        if self.is_alive():
+            self.queue.join()
+    
+    def run(self):
+        while True:
+            item = self.queue.get()
+            batch = []
+            deadline = time.time() + self.window
+            while item is not None:
+                batch.append(item)
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+            try:
+                if len(batch):
+                    self._write(batch)
+            except Exception:
+                _debug_print('Exception in console pipeline:')
+                if config('debug', False):
+                    traceback.print_exc()
+            for _ in range(len(batch) + (1 if item is None else 0)):
+                self.queue.task_done()
+            if item is None: # put by stop, after all the messages sent before it
+                break
+    
+    def start(self):
+        self.stopped = False
+        super().start()
+    
+    def stats(self):
+        """Returns a dict with the number of tellraws requested and actually written, the number of written tellraws per second since the bot started, the number of batches, and the average and maximum number of tellraws per batch."""
+        return {
+            'batch_avg': self.batched / self.batches if self.batches else 0.0,
+            'batch_max': self.max_batch,
+            'batches': self.batches,
+            'requested': self.requested,
+            'writes_per_sec': self.written / max(time.time() - self.started, 1.0),
+            'written': self.written
+        }
+    
+    def stop(self, timeout=10):
+        if self.is_alive() and not self.stopped:
+            self.stopped = True
+            self.queue.put(None)
+            self.join(timeout)
+    
+    def tellraw(self, message, player='@a'):
+        """Like minecraft.tellraw, but the message is written with the next batch. If the pipeline isn't running, it is written right away."""
+        self.requested += 1
+        if self.is_alive() and not self.stopped:
+            self.queue.put((message, player))
+        else:
+            self._tellraw(message, player)
+
+ConsolePipeline = ConsolePipeline()
+
+_tweet_cache = TTLCache(maxsize=256, ttl=300)
+
+def _fetch_tweet(status):
+    """Returns the statuses/show response for the given status id, from the cache if possible. A retweet's response includes the retweeted status, which is cached as well."""
+    status = str(status)
+    j = _tweet_cache.get(status)
+    if j is not None:
+        return j
     r = twitter.request('statuses/show', {'id': status})
     j = r.json()
     if r.status_code != 200:
-        raise TwitterError(j.get('errors', {}).get('code', 0), message=j.get('errors', {}).get('message'), status_code=r.status_code)
+        first_error = j.get('errors', [])[0] if len(j.get('errors', [])) else {}
+        raise TwitterError(first_error.get('code', 0), message=first_error.get('message'), status_code=r.status_code)
+    _tweet_cache[status] = j
     if 'retweeted_status' in j:
-        retweeted_request = twitter.request('statuses/show', {'id': j['retweeted_status']['id']})
-        rj = retweeted_request.json()
-        if retweeted_request.status_code != 200:
-            raise TwitterError(rj.get('errors', {}).get('code', 0), message=rj.get('errors', {}).get('message'), status_code=retweeted_request.status_code)
+        _tweet_cache[j['retweeted_status']['id_str']] = j['retweeted_status']
+    return j
+
+def pastetweet(status, link=False, tellraw=False):
+    j = _fetch_tweet(status)
+    if 'retweeted_status' in j:
+        rj = j['retweeted_status']
         tweet_author = '<@' + j['user']['screen_name'] + ' RT @' + rj['user']['screen_name'] + '> '
         tweet_author_tellraw = [
             {
@@ -286,7 +1117,11 @@ def pastetweet(status, link=False, tellraw=False):
     pass #TODO
 
 def set_twitter(person, screen_name):
-    person.twitter = screen_name
+    with nicksub.transaction():
+        person.twitter = screen_name
+    twitter_follow(screen_name)
+
+def twitter_follow(screen_name):
     members_list_id = config('twitter').get('members_list')
     if members_list_id is not None:
         twitter.request('lists/members/create', {'list_id': members_list_id, 'screen_name': screen_name})
@@ -312,6 +1147,59 @@ def parse_timedelta(time_string):
         time_string = time_string[len(number) + 1:]
     return ret
 
+class LogEvent:
+    """A line from the server log, classified by classify_log_line.
+    
+    type is one of 'achievement', 'action', 'chat', 'command', 'death', 'join', 'leave', 'other' (any other server thread info line), or 'ignored' (a line not from the server thread).
+    """
+    def __init__(self, type, log_line, timestamp=None, player=None, message=None, death=None):
+        self.type = type
+        self.log_line = log_line
+        self.timestamp = timestamp
+        self.player = player
+        self.message = message # the chat message, action, or achievement name
+        self.death = death # a deaths.Death if type is 'death'
+
+LOG_LINE_COUNTS = collections.Counter()
+LOG_LINE_COUNTS_SINCE = time.time()
+_LOG_LINE_REGEX = re.compile('(?P<timestamp>' + minecraft.regexes.timestamp + ') \\[Server thread/INFO\\]: (?:' +
+    '\\* (?P<action_player>' + minecraft.regexes.player + ') (?P<action>.*)|' +
+    '<(?P<chat_player>' + minecraft.regexes.player + ')> (?P<chat>.*)|' +
+    '(?P<joinleave_player>' + minecraft.regexes.player + ') (?P<joinleave>left|joined) the game|' +
+    '(?P<achievement_player>' + minecraft.regexes.player + ') has just earned the achievement \\[(?P<achievement>.+)\\]$' +
+    ')')
+_LOG_TIMESTAMP_REGEX = re.compile(minecraft.regexes.timestamp)
+
+def classify_log_line(log_line):
+    """Returns a LogEvent for the given server log line, and counts it in LOG_LINE_COUNTS."""
+    if ' [Server thread/INFO]: ' not in log_line:
+        event = LogEvent('ignored', log_line)
+    else:
+        match = _LOG_LINE_REGEX.match(log_line)
+        if match is None:
+            try:
+                death = deaths.Death(log_line)
+            except ValueError:
+                event = LogEvent('other', log_line)
+            else:
+                event = LogEvent('death', log_line, timestamp=_LOG_TIMESTAMP_REGEX.match(log_line).group(0), player=deaths.mcnick(death.person), death=death)
+        elif match.group('action_player') is not None:
+            event = LogEvent('action', log_line, timestamp=match.group('timestamp'), player=match.group('action_player'), message=match.group('action'))
+        elif match.group('chat_player') is not None:
+            message = match.group('chat')
+            event = LogEvent('command' if message.startswith('!') and not re.match('!+$', message) else 'chat', log_line, timestamp=match.group('timestamp'), player=match.group('chat_player'), message=message)
+        elif match.group('joinleave_player') is not None:
+            event = LogEvent('join' if match.group('joinleave') == 'joined' else 'leave', log_line, timestamp=match.group('timestamp'), player=match.group('joinleave_player'))
+        else:
+            event = LogEvent('achievement', log_line, timestamp=match.group('timestamp'), player=match.group('achievement_player'), message=match.group('achievement'))
+    LOG_LINE_COUNTS[event.type] += 1
+    return event
+
+def log_line_stats():
+    """Returns a dict mapping each type of log line to a (count, lines per second) tuple since the bot was started."""
+    elapsed = max(time.time() - LOG_LINE_COUNTS_SINCE, 1.0)
+    return dict((line_type, (count, count / elapsed)) for line_type, count in LOG_LINE_COUNTS.items())
+
 class InputLoop(threading.Thread):
     def __init__(self):
         super().__init__(name='wurstminebot InputLoop')
@@ -323,10 +1211,10 @@ class InputLoop(threading.Thread):
         try:
             # server log output processing
             _debug_print('[logpipe] ' + log_line)
-            match = re.match(minecraft.regexes.timestamp + ' \\[Server thread/INFO\\]: \\* (' + minecraft.regexes.player + ') (.*)', log_line)
-            if match:
+            event = classify_log_line(log_line)
+            if event.type == 'action':
                 # action
-                player, message = match.group(1, 2)
+                player, message = event.player, event.message
                 try:
                     sender_person = nicksub.Person(player, context='minecraft')
                 except nicksub.PersonNotFoundError:
@@ -335,251 +1223,251 @@ class InputLoop(threading.Thread):
                 sender = (player if sender_person is None else sender_person.irc_nick())
                 subbed_message = nicksub.textsub(message, 'minecraft', 'irc')
                 bot.log(chan, 'ACTION', sender, [chan], subbed_message)
-                bot.say(chan, '* ' + sender + ' ' + subbed_message)
-            else:
-                match = re.match(minecraft.regexes.timestamp + ' \\[Server thread/INFO\\]: <(' + minecraft.regexes.player + ')> (.*)', log_line)
-                if match:
-                    player, message = match.group(1, 2)
-                    try:
-                        sender_person = nicksub.Person(player, context='minecraft')
-                    except nicksub.PersonNotFoundError:
-                        sender_person = None
-                    if message.startswith('!') and not re.match('!+$', message):
-                        # command
-                        cmd = message[1:].split(' ')
-                        try:
-                            command(cmd[0], args=cmd[1:], sender=player, sender_person=sender_person, context='minecraft')
-                        except SystemExit:
-                            _debug_print('Exit in log input loop')
-                            InputLoop.stop()
-                            TimeLoop.stop()
-                            raise
-                        except Exception as e:
-                            minecraft.tellraw('Error: ' + str(e), str(player))
-                            _debug_print('Exception in ' + str(cmd[0]) + ' command from ' + str(player) + ' to in-game chat:')
-                            if config('debug', False):
-                                traceback.print_exc()
+                IRCQueue.say(chan, '* ' + sender + ' ' + subbed_message, lane='relay')
+            elif event.type == 'command':
+                # command
+                player = event.player
+                try:
+                    sender_person = nicksub.Person(player, context='minecraft')
+                except nicksub.PersonNotFoundError:
+                    sender_person = None
+                cmd = event.message[1:].split(' ')
+                try:
+                    command(cmd[0], args=cmd[1:], sender=player, sender_person=sender_person, context='minecraft')
+                except SystemExit:
+                    _debug_print('Exit in log input loop')
+                    InputLoop.stop()
+                    TimeLoop.stop()
+                    raise
+                except Exception as e:
+                    ConsolePipeline.tellraw('Error: ' + str(e), str(player))
+                    _debug_print('Exception in ' + str(cmd[0]) + ' command from ' + str(player) + ' to in-game chat:')
+                    if config('debug', False):
+                        traceback.print_exc()
+            elif event.type == 'chat':
+                # chat message
+                player, message = event.player, event.message
+                try:
+                    sender_person = nicksub.Person(player, context='minecraft')
+                except nicksub.PersonNotFoundError:
+                    sender_person = None
+                chan = config('irc').get('main_channel', '#wurstmineberg')
+                sender = (player if sender_person is None else sender_person.irc_nick())
+                subbed_message = nicksub.textsub(message, 'minecraft', 'irc')
+                bot.log(chan, 'PRIVMSG', sender, [chan], subbed_message)
+                IRCQueue.say(chan, '<' + sender + '> ' + subbed_message, lane='relay')
+            elif event.type in ('join', 'leave'):
+                # join/leave
+                timestamp, player = event.timestamp, event.player
+                joined = event.type == 'join'
+                new_player = known_player(player) is None
+                _online_players_event(player, joined)
+                with open(os.path.join(config('paths')['logs'], 'logins.log'), 'a') as loginslog:
+                    print(timestamp + ' ' + player + ' ' + ('joined' if joined else 'left') + ' the game', file=loginslog)
+                _known_players_update()
+                record_last_seen(player)
+                if joined:
+                    if new_player:
+                        welcome_message = (0, 2) # The “welcome to the server” message
                     else:
-                        # chat message
-                        chan = config('irc').get('main_channel', '#wurstmineberg')
-                        sender = (player if sender_person is None else sender_person.irc_nick())
-                        subbed_message = nicksub.textsub(message, 'minecraft', 'irc')
-                        bot.log(chan, 'PRIVMSG', sender, [chan], subbed_message)
-                        bot.say(chan, '<' + sender + '> ' + subbed_message)
-                else:
-                    match = re.match('(' + minecraft.regexes.timestamp + ') \\[Server thread/INFO\\]: (' + minecraft.regexes.player + ') (left|joined) the game', log_line)
-                    if match:
-                        # join/leave
-                        timestamp, player = match.group(1, 2)
-                        joined = bool(match.group(3) == 'joined')
-                        with open(os.path.join(config('paths')['logs'], 'logins.log')) as loginslog:
-                            for line in loginslog:
-                                if player in line:
-                                    new_player = False
-                                    break
-                            else:
-                                new_player = True
-                        with open(os.path.join(config('paths')['logs'], 'logins.log'), 'a') as loginslog:
-                            print(timestamp + ' ' + player + ' ' + ('joined' if joined else 'left') + ' the game', file=loginslog)
-                        if joined:
-                            if new_player:
-                                welcome_message = (0, 2) # The “welcome to the server” message
-                            else:
-                                welcome_messages = dict(((1, index), 1.0) for index in range(len(config('comment_lines').get('server_join', []))))
-                                try:
-                                    person = nicksub.Person(player, context='minecraft')
-                                except PersonNotFoundError:
-                                    welcome_messages[0, -1] = 16.0 # The “how did you do that?” welcome message
-                                else:
-                                    if person.description is None:
-                                        welcome_messages[0, 1] = 1.0 # The “you still don't have a description” welcome message
-                                for index, adv_welcome_msg in enumerate(config('advanced_comment_lines').get('server_join', [])):
-                                    if 'text' not in adv_welcome_msg:
-                                        continue
-                                    welcome_messages[2, index] = adv_welcome_msg.get('weight', 1.0) * adv_welcome_msg.get('player_weights', {}).get(player, adv_welcome_msg.get('player_weights', {}).get('@default', 1.0))
-                                random_index = random.uniform(0.0, sum(welcome_messages.values()))
-                                index = 0.0
-                                for welcome_message, weight in welcome_messages.items():
-                                    if random_index - index < weight:
-                                        break
-                                    else:
-                                        index += weight
-                                else:
-                                    welcome_message = (0, 0)
-                            if welcome_message == (0, 0):
-                                minecraft.tellraw({'text': 'Hello ' + player + '. Um... sup?', 'color': 'gray'}, player)
-                            if welcome_message == (0, 1):
-                                minecraft.tellraw([
-                                    {
-                                        'text': 'Hello ' + player + ". You still don't have a description for ",
-                                        'color': 'gray'
-                                    },
-                                    {
-                                        'text': 'the people page',
-                                        'hoverEvent': {
-                                            'action': 'show_text',
-                                            'value': 'http://wurstmineberg.de/people'
-                                        },
-                                        'clickEvent': {
-                                            'action': 'open_url',
-                                            'value': 'http://wurstmineberg.de/people'
-                                        },
-                                        'color': 'gray'
-                                    },
-                                    {
-                                        'text': '. ',
-                                        'color': 'gray'
-                                    },
-                                    {
-                                        'text': 'Write one today',
-                                        'clickEvent': {
-                                            'action': 'suggest_command',
-                                            'value': '!people ' + person.id + ' description '
-                                        },
-                                        'color': 'gray'
-                                    },
-                                    {
-                                        'text': '!',
-                                        'color': 'gray'
-                                    }
-                                ], player)
-                            elif welcome_message == (0, 2):
-                                minecraft.tellraw({
-                                    'text': 'Hello ' + player + '. Welcome to the server!',
-                                    'color': 'gray'
-                                }, player)
-                            elif welcome_message[0] == 1:
-                                minecraft.tellraw({
-                                    'text': 'Hello ' + player + '. ' + config('comment_lines')['server_join'][welcome_message[1]],
-                                    'color': 'gray'
-                                }, player)
-                            elif welcome_message[0] == 2:
-                                message_dict = config('advanced_comment_lines')['server_join'][welcome_message[1]]
-                                message_list = message_dict['text']
-                                if isinstance(message_list, str):
-                                    message_list = [{'text': message_list, 'color': 'gray'}]
-                                elif isinstance(message_list, dict):
-                                    message_list = [message_list]
-                                minecraft.tellraw(([
-                                    {
-                                        'text': 'Hello ' + player + '. ',
-                                        'color': 'gray'
-                                    }
-                                ] if message_dict.get('hello_prefix', True) else []) + message_list, player)
+                        welcome_messages = dict(((1, index), 1.0) for index in range(len(config('comment_lines').get('server_join', []))))
+                        try:
+                            person = nicksub.Person(player, context='minecraft')
+                        except PersonNotFoundError:
+                            welcome_messages[0, -1] = 16.0 # The “how did you do that?” welcome message
+                        else:
+                            if person.description is None:
+                                welcome_messages[0, 1] = 1.0 # The “you still don't have a description” welcome message
+                        for index, adv_welcome_msg in enumerate(config('advanced_comment_lines').get('server_join', [])):
+                            if 'text' not in adv_welcome_msg:
+                                continue
+                            welcome_messages[2, index] = adv_welcome_msg.get('weight', 1.0) * adv_welcome_msg.get('player_weights', {}).get(player, adv_welcome_msg.get('player_weights', {}).get('@default', 1.0))
+                        random_index = random.uniform(0.0, sum(welcome_messages.values()))
+                        index = 0.0
+                        for welcome_message, weight in welcome_messages.items():
+                            if random_index - index < weight:
+                                break
                             else:
-                                minecraft.tellraw({
-                                    'text': 'Hello ' + player + '. How did you do that?',
-                                    'color': 'gray'
-                                }, player)
-                        if config('irc').get('player_list', 'announce') == 'announce':
-                            bot.say(config('irc')['main_channel'], nicksub.sub(player, 'minecraft', 'irc') + ' ' + ('joined' if joined else 'left') + ' the game')
-                        update_all()
+                                index += weight
+                        else:
+                            welcome_message = (0, 0)
+                    if welcome_message == (0, 0):
+                        ConsolePipeline.tellraw({'text': 'Hello ' + player + '. Um... sup?', 'color': 'gray'}, player)
+                    if welcome_message == (0, 1):
+                        ConsolePipeline.tellraw([
+                            {
+                                'text': 'Hello ' + player + ". You still don't have a description for ",
+                                'color': 'gray'
+                            },
+                            {
+                                'text': 'the people page',
+                                'hoverEvent': {
+                                    'action': 'show_text',
+                                    'value': 'http://wurstmineberg.de/people'
+                                },
+                                'clickEvent': {
+                                    'action': 'open_url',
+                                    'value': 'http://wurstmineberg.de/people'
+                                },
+                                'color': 'gray'
+                            },
+                            {
+                                'text': '. ',
+                                'color': 'gray'
+                            },
+                            {
+                                'text': 'Write one today',
+                                'clickEvent': {
+                                    'action': 'suggest_command',
+                                    'value': '!people ' + person.id + ' description '
+                                },
+                                'color': 'gray'
+                            },
+                            {
+                                'text': '!',
+                                'color': 'gray'
+                            }
+                        ], player)
+                    elif welcome_message == (0, 2):
+                        ConsolePipeline.tellraw({
+                            'text': 'Hello ' + player + '. Welcome to the server!',
+                            'color': 'gray'
+                        }, player)
+                    elif welcome_message[0] == 1:
+                        ConsolePipeline.tellraw({
+                            'text': 'Hello ' + player + '. ' + config('comment_lines')['server_join'][welcome_message[1]],
+                            'color': 'gray'
+                        }, player)
+                    elif welcome_message[0] == 2:
+                        message_dict = config('advanced_comment_lines')['server_join'][welcome_message[1]]
+                        message_list = message_dict['text']
+                        if isinstance(message_list, str):
+                            message_list = [{'text': message_list, 'color': 'gray'}]
+                        elif isinstance(message_list, dict):
+                            message_list = [message_list]
+                        ConsolePipeline.tellraw(([
+                            {
+                                'text': 'Hello ' + player + '. ',
+                                'color': 'gray'
+                            }
+                        ] if message_dict.get('hello_prefix', True) else []) + message_list, player)
                     else:
-                        match = re.match(minecraft.regexes.timestamp + ' \\[Server thread/INFO\\]: (' + minecraft.regexes.player + ') has just earned the achievement \\[(.+)\\]$', log_line)
-                        if match:
-                            # achievement
-                            player, achievement = match.group(1, 2)
-                            if ACHIEVEMENTTWEET:
-                                status = '[Achievement Get] ' + nicksub.sub(player, 'minecraft', 'twitter') + ' got ' + achievement
-                                try:
-                                    twid = tweet(status)
-                                except TwitterError as e:
-                                    twid = 'error ' + str(e.status_code) + ': ' + str(e)
-                                else:
-                                    twid = 'https://twitter.com/wurstmineberg/status/' + str(twid)
-                            else:
-                                twid = 'achievement tweets are disabled'
-                            bot.say(config('irc')['main_channel'], 'Achievement Get: ' + nicksub.sub(player, 'minecraft', 'irc') + ' got ' + achievement + ' [' + twid + ']')
+                        ConsolePipeline.tellraw({
+                            'text': 'Hello ' + player + '. How did you do that?',
+                            'color': 'gray'
+                        }, player)
+                if config('irc').get('player_list', 'announce') == 'announce':
+                    IRCQueue.say(config('irc')['main_channel'], nicksub.sub(player, 'minecraft', 'irc') + ' ' + ('joined' if joined else 'left') + ' the game', lane='relay')
+                update_all_later.request() # several joins or leaves in a row only update once, and not on this thread
+            elif event.type == 'achievement':
+                # achievement
+                player, achievement = event.player, event.message
+                irc_message = 'Achievement Get: ' + nicksub.sub(player, 'minecraft', 'irc') + ' got ' + achievement
+                if ACHIEVEMENTTWEET:
+                    def _achievement_tweeted(twid, error, irc_message=irc_message):
+                        if error is None:
+                            twid = 'https://twitter.com/wurstmineberg/status/' + str(twid)
                         else:
+                            twid = 'error ' + str(error.status_code) + ': ' + str(error)
+                        IRCQueue.say(config('irc')['main_channel'], irc_message + ' [' + twid + ']', lane='relay')
+                    
+                    TweetQueue.put('[Achievement Get] ' + nicksub.sub(player, 'minecraft', 'twitter') + ' got ' + achievement, callback=_achievement_tweeted)
+                else:
+                    IRCQueue.say(config('irc')['main_channel'], irc_message + ' [achievement tweets are disabled]', lane='relay')
+            elif event.type == 'death':
+                # death
+                death = event.death
+                with open(os.path.join(config('paths')['logs'], 'deaths.log'), 'a') as deathslog:
+                    print(death.timestamp.strftime('%Y-%m-%d %H:%M:%S') + ' ' + death.message(), file=deathslog)
+                try:
+                    death_store().add(death)
+                except Exception:
+                    _debug_print('Exception while recording a death in the deaths database:')
+                    if config('debug', False):
+                        traceback.print_exc()
+                if DEATHTWEET:
+                    if death.message() == LASTDEATH:
+                        comment = 'Again.' # This prevents botspam if the same player dies lots of times (more than twice) for the same reason.
+                    elif (death.id == 'slain-player-using' and death.groups[1] == 'Sword of Justice') or (death.id == 'shot-player-using' and death.groups[1] == 'Bow of Justice'): # Death Games success
+                        comment = 'And loses a diamond http://wiki.wurstmineberg.de/Death_Games'
+                        try:
+                            target = nicksub.Person(death.groups[0], context='minecraft')
+                        except nicksub.PersonNotFoundError:
+                            pass # don't automatically log
+                        else:
+                            death_games_log(death.person, target, success=True)
+                    else:
+                        death_comments = dict(((1, index), 1.0) for index in range(len(config('comment_lines').get('death', []))))
+                        for index, adv_death_comment in enumerate(config('advanced_comment_lines').get('death', [])):
+                            if 'text' not in adv_death_comment:
+                                continue
                             try:
-                                death = deaths.Death(log_line)
-                            except ValueError:
-                                pass # no death, continue parsing here or ignore this line
+                                death_comments[2, index] = adv_death_comment.get('weight', 1.0) * adv_death_comment.get('player_weights', {}).get(death.player.id, adv_death_comment.get('player_weights', {}).get('@default', 1.0)) * adv_death_comment.get('type_weights', {}).get(death.id, adv_death_comment.get('type_weights', {}).get('@default', 1.0))
+                            except:
+                                continue
+                        random_index = random.uniform(0.0, sum(death_comments.values()))
+                        index = 0.0
+                        for comment_index, weight in death_comments.items():
+                            if random_index - index < weight:
+                                break
                             else:
-                                with open(os.path.join(config('paths')['logs'], 'deaths.log'), 'a') as deathslog:
-                                    print(death.timestamp.strftime('%Y-%m-%d %H:%M:%S') + ' ' + death.message(), file=deathslog)
-                                if DEATHTWEET:
-                                    if death.message() == LASTDEATH:
-                                        comment = 'Again.' # This prevents botspam if the same player dies lots of times (more than twice) for the same reason.
-                                    elif (death.id == 'slain-player-using' and death.groups[1] == 'Sword of Justice') or (death.id == 'shot-player-using' and death.groups[1] == 'Bow of Justice'): # Death Games success
-                                        comment = 'And loses a diamond http://wiki.wurstmineberg.de/Death_Games'
-                                        try:
-                                            target = nicksub.Person(death.groups[0], context='minecraft')
-                                        except nicksub.PersonNotFoundError:
-                                            pass # don't automatically log
-                                        else:
-                                            death_games_log(death.person, target, success=True)
-                                    else:
-                                        death_comments = dict(((1, index), 1.0) for index in range(len(config('comment_lines').get('death', []))))
-                                        for index, adv_death_comment in enumerate(config('advanced_comment_lines').get('death', [])):
-                                            if 'text' not in adv_death_comment:
-                                                continue
-                                            try:
-                                                death_comments[2, index] = adv_death_comment.get('weight', 1.0) * adv_death_comment.get('player_weights', {}).get(death.player.id, adv_death_comment.get('player_weights', {}).get('@default', 1.0)) * adv_death_comment.get('type_weights', {}).get(death.id, adv_death_comment.get('type_weights', {}).get('@default', 1.0))
-                                            except:
-                                                continue
-                                        random_index = random.uniform(0.0, sum(death_comments.values()))
-                                        index = 0.0
-                                        for comment_index, weight in death_comments.items():
-                                            if random_index - index < weight:
-                                                break
-                                            else:
-                                                index += weight
-                                        else:
-                                            comment_index = (0, 0)
-                                        if comment_index == (0, 0):
-                                            comment = 'Well done.'
-                                        elif comment_index[0] == 1:
-                                            comment = config('comment_lines')['death'][comment_index[1]]
-                                        elif comment_index[0] == 2:
-                                            comment = config('advanced_comment_lines')['death'][comment_index[1]]['text']
-                                        else:
-                                            comment = "I don't even."
-                                    LASTDEATH = death.message()
-                                    status = death.tweet(comment=comment)
-                                    try:
-                                        twid = tweet(status)
-                                    except TwitterError as e:
-                                        twid = 'error ' + str(e.status_code) + ': ' + str(e)
-                                        minecraft.tellraw([
-                                            {
-                                                'text': 'Your fail has ',
-                                                'color': 'gold'
-                                            },
-                                            {
-                                                'text': 'not',
-                                                'color': 'red'
-                                            },
-                                            {
-                                                'text': ' been reported because of ',
-                                                'color': 'gold'
-                                            },
-                                            {
-                                                'text': 'reasons',
-                                                'hoverEvent': {
-                                                    'action': 'show_text',
-                                                    'value': str(e.status_code) + ': ' + str(e)
-                                                },
-                                                'color': 'gold'
-                                            },
-                                            {
-                                                'text': '.',
-                                                'color': 'gold'
-                                            }
-                                        ])
-                                    else:
-                                        twid = 'https://twitter.com/wurstmineberg/status/' + str(twid)
-                                        minecraft.tellraw({
-                                            'text': 'Your fail has been reported. Congratulations.',
-                                            'color': 'gold',
-                                            'clickEvent': {
-                                                'action': 'open_url',
-                                                'value': twid
-                                            }
-                                        })
-                                else:
-                                    twid = 'deathtweets are disabled'
-                                bot.say(config('irc')['main_channel'], death.irc_message(tweet_info=twid))
+                                index += weight
+                        else:
+                            comment_index = (0, 0)
+                        if comment_index == (0, 0):
+                            comment = 'Well done.'
+                        elif comment_index[0] == 1:
+                            comment = config('comment_lines')['death'][comment_index[1]]
+                        elif comment_index[0] == 2:
+                            comment = config('advanced_comment_lines')['death'][comment_index[1]]['text']
+                        else:
+                            comment = "I don't even."
+                    LASTDEATH = death.message()
+                    def _death_tweeted(twid, error, death=death):
+                        if error is None:
+                            twid = 'https://twitter.com/wurstmineberg/status/' + str(twid)
+                            ConsolePipeline.tellraw({
+                                'text': 'Your fail has been reported. Congratulations.',
+                                'color': 'gold',
+                                'clickEvent': {
+                                    'action': 'open_url',
+                                    'value': twid
+                                }
+                            })
+                        else:
+                            twid = 'error ' + str(error.status_code) + ': ' + str(error)
+                            ConsolePipeline.tellraw([
+                                {
+                                    'text': 'Your fail has ',
+                                    'color': 'gold'
+                                },
+                                {
+                                    'text': 'not',
+                                    'color': 'red'
+                                },
+                                {
+                                    'text': ' been reported because of ',
+                                    'color': 'gold'
+                                },
+                                {
+                                    'text': 'reasons',
+                                    'hoverEvent': {
+                                        'action': 'show_text',
+                                        'value': str(error.status_code) + ': ' + str(error)
+                                    },
+                                    'color': 'gold'
+                                },
+                                {
+                                    'text': '.',
+                                    'color': 'gold'
+                                }
+                            ])
+                        IRCQueue.say(config('irc')['main_channel'], death.irc_message(tweet_info=twid), lane='relay')
+                    
+                    TweetQueue.put(death.tweet(comment=comment), callback=_death_tweeted)
+                else:
+                    IRCQueue.say(config('irc')['main_channel'], death.irc_message(tweet_info='deathtweets are disabled'), lane='relay')
+            return event
         except SystemExit:
             _debug_print('Exit in log input loop')
             InputLoop.stop()
@@ -643,11 +1531,7 @@ def telltime(func=None, comment=False, restart=False):
     if func is None:
         def func(msg):
             for line in msg.splitlines():
-                try:
-                    minecraft.tellraw({'text': line, 'color': 'gold'})
-                except socket.error:
-                    bot.say(config('irc').get('main_channel', '#wurstmineberg'), 'Warning: telltime is disconnected from Minecraft')
-                    break
+                ConsolePipeline.tellraw({'text': line, 'color': 'gold'})
         
         custom_func = False
     else:
@@ -657,11 +1541,7 @@ def telltime(func=None, comment=False, restart=False):
             func(msg)
         else:
             for line in msg.splitlines():
-                try:
-                    minecraft.tellraw({'text': line, 'color': 'red'})
-                except socket.error:
-                    bot.say(config('irc').get('main_channel', '#wurstmineberg'), 'Warning: telltime is disconnected from Minecraft')
-                    break
+                ConsolePipeline.tellraw({'text': line, 'color': 'red'})
     
     global DST
     global PREVIOUS_TOPIC
@@ -696,7 +1576,7 @@ def telltime(func=None, comment=False, restart=False):
         elif localnow.hour == 6:
             func('Are you still going, just starting or asking yourself the same thing?')
         elif localnow.hour == 11 and localnow.minute < 5 and restart:
-            players = minecraft.online_players()
+            players = online_players()
             if len(players):
                 warning('The server is going to restart in 5 minutes.')
                 time.sleep(240)
@@ -704,7 +1584,9 @@ def telltime(func=None, comment=False, restart=False):
                 time.sleep(50)
             PREVIOUS_TOPIC = (config('irc')['topic'] + ' | ' if 'topic' in config('irc') and config('irc')['topic'] is not None else '') + 'The server is restarting…'
             bot.topic(config('irc')['main_channel'], PREVIOUS_TOPIC)
-            if minecraft.restart(reply=func):
+            success = minecraft.restart(reply=func)
+            invalidate_online_players() # players were kicked
+            if success:
                 if len(players):
                     irc_players = []
                     for player in players:
@@ -712,9 +1594,9 @@ def telltime(func=None, comment=False, restart=False):
                             irc_players.append(nicksub.Person(player, context='minecraft').irc_nick(respect_highlight_option=False))
                         except:
                             irc_players.append(player)
-                    bot.say(config('irc').get('main_channel', '#wurstmineberg'), ', '.join(irc_players) + ': The server has restarted.')
+                    IRCQueue.say(config('irc').get('main_channel', '#wurstmineberg'), ', '.join(irc_players) + ': The server has restarted.')
             else:
-                bot.say(config('irc').get('main_channel', '#wurstmineberg'), 'Please help! Something went wrong with the server restart!')
+                IRCQueue.say(config('irc').get('main_channel', '#wurstmineberg'), 'Please help! Something went wrong with the server restart!')
             update_topic()
     DST = dst
 
@@ -724,7 +1606,7 @@ def update_topic(force=False):
     if main_channel is None:
         return
     players = []
-    for mcnick in (minecraft.online_players() if config('irc').get('player_list', 'announce') == 'topic' else []):
+    for mcnick in (online_players() if config('irc').get('player_list', 'announce') == 'topic' else []):
         try:
             person = nicksub.Person(mcnick, context='minecraft').irc_nick(respect_highlight_option=False)
         except nicksub.PersonNotFoundError:
@@ -757,39 +1639,245 @@ def mwiki_lookup(article=None, args=[], permission_level=0, reply=None, sender=N
         else:
             reply('Unknown article')
             return 'Unknown article'
-    match = re.match('http://(?:minecraft\\.gamepedia\\.com|minecraftwiki\\.net(?:/wiki)?)/(.*)', article)
-    if match:
-        article = match.group(1)
-    request = requests.get('http://minecraft.gamepedia.com/' + article, params={'action': 'raw'})
-    if request.status_code == 200:
-        if request.text.lower().startswith('#redirect'):
-            match = re.match('#[Rr][Ee][Dd][Ii][Rr][Ee][Cc][Tt] \\[\\[(.+)(\\|.*)?\\]\\]', request.text)
-            if match:
-                redirect_target = 'http://minecraft.gamepedia.com/' + re.sub(' ', '_', match.group(1))
-                reply('Redirect ' + redirect_target)
-                return 'Redirect ' + redirect_target
+    articles = []
+    for name in article.split('|'): # several articles can be looked up at once, separated by |
+        name = name.strip(' _')
+        match = re.match('http://(?:minecraft\\.gamepedia\\.com|minecraftwiki\\.net(?:/wiki)?)/(.*)', name)
+        if match:
+            name = match.group(1)
+        articles.append(name)
+    try:
+        resolved = mwiki_resolve(articles)
+    except (ValueError, requests.exceptions.RequestException) as e:
+        reply('Error: ' + str(e))
+        return 'Error: ' + str(e)
+    ret = []
+    for name in articles:
+        status, url = resolved[name]
+        if status == 'article':
+            ret.append('Article ' + url)
+        elif status == 'redirect':
+            ret.append('Redirect ' + url)
+        elif status == 'broken':
+            ret.append('Broken redirect')
+        else:
+            ret.append('Error 404')
+    for line in ret:
+        reply(line)
+    return '\n'.join(ret)
+
+_mwiki_cache = TTLCache(maxsize=512, ttl=3600)
+
+def mwiki_resolve(articles):
+    """Looks up Minecraft Wiki articles, using one API request for all of them that aren't cached. Page contents are not downloaded.
+    
+    Returns a dict mapping each article name to a (status, url) pair, where status is 'article', 'redirect' (and url is the final target of the redirect chain), 'broken' (a redirect to a missing page), or 'missing' (and url is None). Results are cached for an hour, missing articles for 5 minutes.
+    """
+    ret = {}
+    uncached = []
+    for name in articles:
+        try:
+            ret[name] = _mwiki_cache[name]
+        except KeyError:
+            if name not in uncached:
+                uncached.append(name)
+    for start in range(0, len(uncached), 50): # the API accepts at most 50 titles per request
+        batch = uncached[start:start + 50]
+        request = httpclient.get('http://minecraft.gamepedia.com/api.php', params={
+            'action': 'query',
+            'format': 'json',
+            'redirects': '',
+            'titles': '|'.join(name.replace('_', ' ') for name in batch)
+        })
+        if request.status_code != 200:
+            raise ValueError('Error ' + str(request.status_code))
+        query = request.json().get('query', {})
+        normalized = dict((entry['from'], entry['to']) for entry in query.get('normalized', []))
+        redirects = dict((entry['from'], (entry['to'], entry.get('tofragment'))) for entry in query.get('redirects', []))
+        pages = dict((page.get('title'), page) for page in query.get('pages', {}).values())
+        
+        def exists(title):
+            return title in pages and 'missing' not in pages[title] and 'invalid' not in pages[title]
+        
+        for name in batch:
+            title = name.replace('_', ' ')
+            title = normalized.get(title, title)
+            if title in redirects:
+                target, fragment = redirects[title]
+                seen = set([title])
+                while target in redirects and target not in seen: # double redirects are listed hop by hop
+                    seen.add(target)
+                    target, next_fragment = redirects[target]
+                    if next_fragment is not None:
+                        fragment = next_fragment
+                if exists(target):
+                    result = ('redirect', 'http://minecraft.gamepedia.com/' + target.replace(' ', '_') + ('' if fragment is None else '#' + fragment.replace(' ', '_')))
+                else:
+                    result = ('broken', None)
+            elif exists(title):
+                result = ('article', 'http://minecraft.gamepedia.com/' + title.replace(' ', '_'))
             else:
-                reply('Broken redirect')
-                return 'Broken redirect'
+                result = ('missing', None)
+            _mwiki_cache.set(name, result, ttl=300 if result[0] == 'missing' else None)
+            ret[name] = result
+    return ret
+
+_mojira_cache = TTLCache(maxsize=256, ttl=3600)
+_MOJIRA_TITLE_REGEX = re.compile('<title>\\[([A-Z]+)-([0-9]+)\\] (.+?) - Mojira</title>', re.DOTALL)
+
+def mojira_title(issue_key):
+    """Returns the key and title of a Mojira issue as a tuple, or None if there is no such issue.
+    
+    Only the beginning of the issue page is downloaded, up to the title. Titles are cached for an hour, missing issues for 5 minutes. The key can be different from the one requested if the issue has been moved.
+    """
+    try:
+        return _mojira_cache[issue_key]
+    except KeyError:
+        pass
+    request = httpclient.get('http://mojang.atlassian.net/browse/' + issue_key, stream=True)
+    try:
+        if request.status_code == 404:
+            _mojira_cache.set(issue_key, None, ttl=300)
+            return None
+        if request.status_code != 200:
+            raise ValueError('Error ' + str(request.status_code))
+        page = b''
+        for chunk in request.iter_content(chunk_size=4096):
+            page += chunk
+            match = _MOJIRA_TITLE_REGEX.search(page.decode('utf-8', errors='replace'))
+            if match or b'</title>' in page or len(page) > 65536:
+                break
         else:
-            reply('Article http://minecraft.gamepedia.com/' + article)
-            return 'Article http://minecraft.gamepedia.com/' + article
+            match = None
+    finally:
+        request.close() # the rest of the page is not needed
+    if not match:
+        raise ValueError('could not get title')
+    ret = (match.group(1) + '-' + match.group(2), xml.sax.saxutils.unescape(' '.join(match.group(3).split()), {'&quot;': '"', '&#39;': "'"}))
+    _mojira_cache[issue_key] = ret
+    return ret
+
+def mojira_paste(issue_key, title, link=False, tellraw=False):
+    url = 'http://mojang.atlassian.net/browse/' + issue_key
+    if tellraw:
+        return {
+            'text': '[' + issue_key + '] ' + title,
+            'color': 'gold',
+            'clickEvent': {
+                'action': 'open_url',
+                'value': url
+            }
+        }
+    return '[' + issue_key + '] ' + title + (' [' + url + ']' if link else '')
+
+_death_games = {
+    'deathgames': None, # the path of the deathgames.json the log is exported to
+    'export_timer': None, # the pending death_games_export, if any
+    'journal': None, # the path of the journal the log was loaded from
+    'log': [], # all entries, in the deathgames.json format
+    'stats': {} # maps person ids to their counters, see _death_games_count
+}
+_death_games_lock = threading.RLock()
+
+def _death_games_paths():
+    deathgames_path = config('paths').get('deathgames', '/opt/wurstmineberg/log/deathgames.json')
+    return deathgames_path, config('paths').get('deathgamesjournal', os.path.splitext(deathgames_path)[0] + '.jsonl')
+
+def _death_games_count(entry):
+    for person_id, role in ((entry['attacker'], 'attacks'), (entry['target'], 'targeted')):
+        counters = _death_games['stats'].setdefault(person_id, {
+            'attacks': {'fail': 0, 'win': 0},
+            'targeted': {'fail': 0, 'win': 0}
+        })
+        counters[role]['win' if entry['success'] else 'fail'] += 1
+
+def _death_games_load():
+    """Loads the Death Games journal, unless it is already loaded. If there is no journal yet, it is created from the log in deathgames.json. Must be called with _death_games_lock held."""
+    deathgames_path, journal_path = _death_games_paths()
+    if _death_games['journal'] == journal_path:
+        return
+    log = []
+    if os.path.exists(journal_path):
+        with open(journal_path) as journal:
+            for line in journal:
+                if line.strip():
+                    log.append(json.loads(line))
     else:
-        reply('Error ' + str(request.status_code))
-        return 'Error ' + str(request.status_code)
+        try:
+            with open(deathgames_path) as logfile:
+                log = json.load(logfile).get('log', [])
+        except (IOError, OSError, ValueError):
+            log = []
+        with open(journal_path + '.tmp', 'w') as journal:
+            for entry in log:
+                print(json.dumps(entry, sort_keys=True), file=journal)
+        os.rename(journal_path + '.tmp', journal_path)
+    if _death_games['export_timer'] is not None: # the paths changed in the config, finish the pending export to the old file
+        _death_games['export_timer'].cancel()
+        _death_games_write(_death_games['deathgames'], _death_games['log'])
+    _death_games['deathgames'] = deathgames_path
+    _death_games['export_timer'] = None
+    _death_games['journal'] = journal_path
+    _death_games['log'] = log
+    _death_games['stats'] = {}
+    for entry in log:
+        _death_games_count(entry)
+
+def _death_games_write(deathgames_path, log):
+    try:
+        with open(deathgames_path) as logfile:
+            deathgames = json.load(logfile)
+    except (IOError, OSError, ValueError):
+        deathgames = {}
+    deathgames['log'] = log
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(deathgames_path)), prefix='.deathgames.', suffix='.tmp', delete=False) as logfile:
+        json.dump(deathgames, logfile, sort_keys=True, indent=4, separators=(',', ': '))
+    os.chmod(logfile.name, 0o644)
+    os.rename(logfile.name, deathgames_path)
+
+def death_games_export():
+    """Writes the Death Games log from the journal to deathgames.json, in the format used by the website. Other keys in deathgames.json are kept."""
+    with _death_games_lock:
+        _death_games_load()
+        _death_games['export_timer'] = None
+        _death_games_write(_death_games['deathgames'], _death_games['log'])
+
+def death_games_flush():
+    """Runs a pending death_games_export right away, for shutting down the bot."""
+    with _death_games_lock:
+        if _death_games['export_timer'] is not None:
+            _death_games['export_timer'].cancel()
+            death_games_export()
+
+def death_games_stats(person_id=None):
+    """Returns the Death Games counters of a person as a dict with the keys 'attacks' and 'targeted', each a dict with the number of successful ('win') and failed ('fail') attempts. Without a person id, a dict mapping person ids to their counters is returned."""
+    with _death_games_lock:
+        _death_games_load()
+        if person_id is None:
+            return copy.deepcopy(_death_games['stats'])
+        return copy.deepcopy(_death_games['stats'].get(person_id, {
+            'attacks': {'fail': 0, 'win': 0},
+            'targeted': {'fail': 0, 'win': 0}
+        }))
 
 def death_games_log(attacker, target, success=True):
-    with open(config('paths').get('deathgames', '/opt/wurstmineberg/log/deathgames.json')) as logfile:
-        log = json.load(logfile)
-    log['log'].append({
+    entry = {
         'attacker': attacker.id,
         'date': datetime.utcnow().strftime('%Y-%m-%d'),
         'success': success,
         'target': target.id
-    })
-    with open(config('paths').get('deathgames', '/opt/wurstmineberg/log/deathgames.json'), 'w') as logfile:
-        json.dump(log, logfile, sort_keys=True, indent=4, separators=(',', ': '))
-    minecraft.tellraw([
+    }
+    with _death_games_lock:
+        _death_games_load()
+        with open(_death_games['journal'], 'a') as journal:
+            print(json.dumps(entry, sort_keys=True), file=journal)
+        _death_games['log'].append(entry)
+        _death_games_count(entry)
+        if _death_games['export_timer'] is None:
+            # deathgames.json is written at most every 30 seconds, not for each entry
+            _death_games['export_timer'] = Timer(30, death_games_export)
+            _death_games['export_timer'].start()
+    ConsolePipeline.tellraw([
         {
             'text': '[Death Games]',
             'clickEvent': {
@@ -827,860 +1915,1006 @@ def death_games_log(attacker, target, success=True):
             'color': 'gold'
         }
     ])
-    bot.say(config('irc').get('main_channel', '#wurstmineberg'), '[Death Games] ' + attacker.irc_nick() + "'s attempt on " + target.irc_nick() + (' succeeded.' if success else ' failed.'))
+    IRCQueue.say(config('irc').get('main_channel', '#wurstmineberg'), '[Death Games] ' + attacker.irc_nick() + "'s attempt on " + target.irc_nick() + (' succeeded.' if success else ' failed.'), lane='relay')
 
-def command(cmd, args=[], context=None, chan=None, reply=None, reply_format=None, sender=None, sender_person=None, addressing=None):
-    if reply is None:
-        if reply_format == 'tellraw' or (reply_format is None and context == 'minecraft'):
-            reply_format = 'tellraw'
-            def reply(msg):
-                if isinstance(msg, str):
-                    for line in msg.splitlines():
-                        minecraft.tellraw({'text': line, 'color': 'gold'}, '@a' if sender is None else sender)
-                else:
-                    minecraft.tellraw(msg, '@a' if sender is None else sender)
+class CommandRequest:
+    """The context in which a command is executed: its arguments, who sent it and from where, and how to reply."""
+    def __init__(self, args=[], context=None, chan=None, reply=None, reply_format=None, sender=None, sender_person=None, permission_level=0):
+        self.args = args
+        self.chan = chan
+        self.context = context
+        self.permission_level = permission_level
+        self.reply_format = 'tellraw' if reply is None and reply_format is None and context == 'minecraft' else reply_format
+        self.sender = sender
+        self.sender_person = sender_person
+        self._reply = reply
+    
+    def reply(self, msg):
+        if self._reply is not None:
+            self._reply(msg)
+        elif self.reply_format == 'tellraw':
+            if isinstance(msg, str):
+                for line in msg.splitlines():
+                    ConsolePipeline.tellraw({'text': line, 'color': 'gold'}, '@a' if self.sender is None else self.sender)
+            else:
+                ConsolePipeline.tellraw(msg, '@a' if self.sender is None else self.sender)
+        elif self.context == 'irc':
+            if not self.sender:
+                for line in msg.splitlines():
+                    IRCQueue.say(config('irc')['main_channel'] if self.chan is None else self.chan, line, lane='bulk')
+            elif self.chan:
+                for line in msg.splitlines():
+                    IRCQueue.say(self.chan, self.sender + ': ' + line, lane='bulk')
+            else:
+                for line in msg.splitlines():
+                    IRCQueue.say(self.sender, line, lane='bulk')
         else:
-            def reply(msg):
-                if context == 'irc':
-                    if not sender:
-                        for line in msg.splitlines():
-                            bot.say(config('irc')['main_channel'] if chan is None else chan, line)
-                    elif chan:
-                        for line in msg.splitlines():
-                            bot.say(chan, sender + ': ' + line)
-                    else:
-                        for line in msg.splitlines():
-                            bot.say(sender, line)
-                else:
-                    _debug_print('[command reply] ' + msg)
+            _debug_print('[command reply] ' + msg)
     
-    def warning(msg):
-        if reply_format == 'tellraw':
-            reply({'text': msg, 'color': 'red'})
+    def warning(self, msg):
+        if self.reply_format == 'tellraw':
+            self.reply({'text': msg, 'color': 'red'})
         else:
-            reply(msg)
+            self.reply(msg)
+
+commands = {} # command name: dict with description, function, permission_level, and usage; filled by register_command
+
+def register_command(name, description, permission_level=0, usage=None, slow=False):
+    """Decorator for a command function, which is called with a CommandRequest. Commands which can take a while, like those making HTTP requests or restarting the server, should be marked as slow so they run in the CommandPool instead of blocking IRC or the log input."""
+    def decorator(function):
+        commands[name] = {
+            'description': description,
+            'function': function,
+            'permission_level': permission_level,
+            'slow': slow,
+            'usage': usage
+        }
+        return function
     
-    def _command_achievementtweet(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        global ACHIEVEMENTTWEET
-        if not len(args):
-            reply('Achievement tweeting is currently ' + ('enabled' if ACHIEVEMENTTWEET else 'disabled'))
-        elif args[0] == 'on':
-            ACHIEVEMENTTWEET = True
-            reply('Achievement tweeting is now enabled')
-        elif args[0] == 'off':
-            def _reenable_achievement_tweets():
-                global ACHIEVEMENTTWEET
-                ACHIEVEMENTTWEET = True
-            
-            if len(args) > 2:
-                warning('Usage: achievementtweet [on | off [<time>]]')
-                return
-            elif len(args) == 2:
-                number = parse_timedelta(str(args[1]))
-                if number > 86400 and permission_level < 4:
-                    warning(errors.permission(4))
-                    return
-                threading.Timer(number, _reenable_achievement_tweets).start()
-            elif permission_level < 4:
-                warning(errors.permission(4))
+    return decorator
+
+class CommandPool:
+    """Runs slow commands on a few worker threads.
+    
+    Each sender can only have a few commands running or waiting at a time, and there is a limit on the total number of commands running or waiting (pending); if either is reached, the command is refused with an error reply. Replies to commands from the same channel (or from the same sender in private chat or Minecraft) are delivered in the order the commands were sent in, not in the order they finish.
+    """
+    def __init__(self, max_workers=4, max_pending=16, max_per_user=2):
+        self.executor = None
+        self.lock = threading.Lock()
+        self.max_pending = max_pending
+        self.max_per_user = max_per_user
+        self.max_workers = max_workers
+        self.pending = 0
+        self.per_user = collections.Counter()
+        self.reply_queues = {} # reply target: deque of the jobs from there which haven't finished, oldest first
+        self.submitted = 0
+        self.refused = 0
+    
+    def _deliver(self, key):
+        """Sends the buffered replies of jobs at the front of the reply queue, and removes finished jobs from it. Must be called with the lock held."""
+        jobs = self.reply_queues[key]
+        while len(jobs):
+            job = jobs[0]
+            for send, msg in job['buffer']:
+                send(msg)
+            job['buffer'] = []
+            if not job['done']:
                 return
-            ACHIEVEMENTTWEET = False
-            reply('Achievement tweeting is now disabled')
-        else:
-            warning('Usage: achievementtweet [on | off [<time>]]')
-    
-    def _command_alias(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        aliases = config('aliases')
-        if len(args) == 0:
-            warning('Usage: alias <alias_name> [<text>...]')
-        elif len(args) == 1:
-            if permission_level >= 4:
-                if str(args[0]) in aliases:
-                    deleted_alias = str(aliases[str(args[0])])
-                    del aliases[str(args[0])]
-                    update_config(['aliases'], aliases)
-                    reply('Alias deleted. (Was “' + deleted_alias + '”)')
-                else:
-                    warning('The alias you' + (' just ' if random.randrange(0, 1) else ' ') + 'tried to delete ' + ("didn't" if random.randrange(0, 1) else 'did not') + (' even ' if random.randrange(0, 1) else ' ') + 'exist' + (' in the first place!' if random.randrange(0, 1) else '!') + (" So I guess everything's fine then?" if random.randrange(0, 1) else '')) # fun with randomized replies
+            jobs.popleft()
+        del self.reply_queues[key]
+    
+    def _reply(self, key, job, send, msg):
+        with self.lock:
+            if self.reply_queues[key][0] is job:
+                send(msg)
             else:
-                warning(errors.permission(4))
-        elif str(args[0]) in aliases and permission_level < 4:
-            warning(errors.permission(4))
-        else:
-            alias_existed = str(args[0]) in aliases
-            aliases[str(args[0])] = ' '.join(args[1:])
-            update_config(['aliases'], aliases)
-            reply('Alias ' + ('edited' if alias_existed else 'added') + ', but hidden because there is a command with the same name.' if str(args[0]).lower() in commands + ['help'] else 'Alias added.')
-    
-    def _command_command(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if args[0]:
-            reply(minecraft.command(args[0], args[1:]))
-        else:
-            warning(errors.argc(1, len(args), atleast=True))
+                job['buffer'].append((send, msg))
     
-    def _command_deathtweet(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        global DEATHTWEET
-        if not len(args):
-            reply('Deathtweeting is currently ' + ('enabled' if DEATHTWEET else 'disabled'))
-        elif args[0] == 'on':
-            DEATHTWEET = True
-            reply('Deathtweeting is now enabled')
-        elif args[0] == 'off':
-            def _reenable_death_tweets():
-                global DEATHTWEET
-                DEATHTWEET = True
-            
-            if len(args) > 2:
-                warning('Usage: achievementtweet [on | off [<time>]]')
-                return
-            elif len(args) == 2:
-                number = parse_timedelta(str(args[1]))
-                if number > 86400 and permission_level < 4:
-                    warning(errors.permission(4))
-                    return
-                threading.Timer(number, _reenable_death_tweets).start()
-            elif permission_level < 4:
-                warning(errors.permission(4))
+    def _run(self, request, function, key, job, user):
+        try:
+            function(request)
+        except SystemExit:
+            # Unlike the other handlers, this doesn't re-raise, since that would only end this worker thread. This relies on the commands which exit the bot (quit, stop bot, restart bot) calling bot.stop() first, which ends bot.run() in the main thread.
+            _debug_print('Exit in command pool')
+            InputLoop.stop()
+            TimeLoop.stop()
+        except Exception as e:
+            request.warning('Error: ' + str(e))
+            _debug_print('Exception in ' + str(function.__name__) + ' from ' + str(request.sender) + ':')
+            if config('debug', False):
+                traceback.print_exc()
+        finally:
+            with self.lock:
+                job['done'] = True
+                self.pending -= 1
+                self.per_user[user] -= 1
+                if not self.per_user[user]:
+                    del self.per_user[user]
+                self._deliver(key)
+    
+    def running(self):
+        return self.executor is not None
+    
+    def start(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'pending': self.pending,
+                'refused': self.refused,
+                'submitted': self.submitted
+            }
+    
+    def stop(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+    
+    def submit(self, request, function):
+        """Schedules function(request) to run in the pool. Returns False if the command was refused, in which case the sender already got an error reply."""
+        user = request.sender if request.sender_person is None else request.sender_person.id
+        key = (request.context, request.chan if request.chan is not None else request.sender)
+        with self.lock:
+            if self.per_user[user] >= self.max_per_user:
+                refusal = 'You already have ' + str(self.per_user[user]) + ' commands running, please wait for them to finish.'
+            elif self.pending >= self.max_pending:
+                refusal = 'I am busy right now, please try again in a moment.'
+            else:
+                refusal = None
+                job = {'buffer': [], 'done': False}
+                self.reply_queues.setdefault(key, collections.deque()).append(job)
+                self.pending += 1
+                self.per_user[user] += 1
+                self.submitted += 1
+            if refusal is not None:
+                self.refused += 1
+        if refusal is not None:
+            request.warning(refusal)
+            return False
+        send = request.reply
+        request.reply = lambda msg: self._reply(key, job, send, msg) # warning uses this too
+        self.executor.submit(self._run, request, function, key, job, user)
+        return True
+
+CommandPool = CommandPool()
+
+def sender_permission_level(sender, sender_person, context):
+    if nicksub.sub(sender, context, 'irc', strict=False) in [None] + config('irc')['op_nicks']:
+        return 4
+    elif sender_person is not None:
+        if sender_person.id in config('ops'):
+            return 4
+        elif sender_person.whitelisted():
+            return 3
+        elif sender_person.invited():
+            return 2
+        return 1
+    else:
+        return 0
+
+@register_command('achievementtweet', 'toggle achievement message tweeting', permission_level=3, usage='[on | off [<time>]]')
+def _command_achievementtweet(request):
+    global ACHIEVEMENTTWEET
+    if not len(request.args):
+        request.reply('Achievement tweeting is currently ' + ('enabled' if ACHIEVEMENTTWEET else 'disabled'))
+    elif request.args[0] == 'on':
+        ACHIEVEMENTTWEET = True
+        request.reply('Achievement tweeting is now enabled')
+    elif request.args[0] == 'off':
+        def _reenable_achievement_tweets():
+            global ACHIEVEMENTTWEET
+            ACHIEVEMENTTWEET = True
+        
+        if len(request.args) > 2:
+            request.warning('Usage: achievementtweet [on | off [<time>]]')
+            return
+        elif len(request.args) == 2:
+            number = parse_timedelta(str(request.args[1]))
+            if number > 86400 and request.permission_level < 4:
+                request.warning(errors.permission(4))
                 return
-            DEATHTWEET = False
-            reply('Deathtweeting is now disabled')
+            Timer(number, _reenable_achievement_tweets).start()
+        elif request.permission_level < 4:
+            request.warning(errors.permission(4))
+            return
+        ACHIEVEMENTTWEET = False
+        request.reply('Achievement tweeting is now disabled')
+    else:
+        request.warning('Usage: achievementtweet [on | off [<time>]]')
+
+@register_command('alias', 'add, edit, or remove an alias (you can use aliases like regular commands)', permission_level=2, usage='<alias_name> [<text>...]')
+def _command_alias(request):
+    aliases = config('aliases')
+    if len(request.args) == 0:
+        request.warning('Usage: alias <alias_name> [<text>...]')
+    elif len(request.args) == 1:
+        if request.permission_level >= 4:
+            if str(request.args[0]) in aliases:
+                deleted_alias = str(aliases[str(request.args[0])])
+                del aliases[str(request.args[0])]
+                update_config(['aliases'], aliases)
+                request.reply('Alias deleted. (Was “' + deleted_alias + '”)')
+            else:
+                request.warning('The alias you' + (' just ' if random.randrange(0, 1) else ' ') + 'tried to delete ' + ("didn't" if random.randrange(0, 1) else 'did not') + (' even ' if random.randrange(0, 1) else ' ') + 'exist' + (' in the first place!' if random.randrange(0, 1) else '!') + (" So I guess everything's fine then?" if random.randrange(0, 1) else '')) # fun with randomized replies
         else:
-            warning('Usage: deathtweet [on | off [<time>]]')
-    
-    def _command_dg(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if len(args) not in [2, 3] or args[0].lower() not in ['win', 'fail']:
-            warning('Usage: dg (win | fail) [<attacker>] <target>')
+            request.warning(errors.permission(4))
+    elif str(request.args[0]) in aliases and request.permission_level < 4:
+        request.warning(errors.permission(4))
+    else:
+        alias_existed = str(request.args[0]) in aliases
+        aliases[str(request.args[0])] = ' '.join(request.args[1:])
+        update_config(['aliases'], aliases)
+        request.reply('Alias ' + ('edited' if alias_existed else 'added') + ', but hidden because there is a command with the same name.' if str(request.args[0]).lower() in list(commands) + ['help'] else 'Alias added.')
+
+@register_command('command', 'perform Minecraft server command', permission_level=4, usage='<command> [<arguments>...]')
+def _command_command(request):
+    if request.args[0]:
+        request.reply(minecraft.command(request.args[0], request.args[1:]))
+    else:
+        request.warning(errors.argc(1, len(request.args), atleast=True))
+
+@register_command('deaths', 'look up deaths by player, the most common causes, or the deaths of the last 7 days', usage='[<player> | top [<number>] | week | import]', slow=True)
+def _command_deaths(request):
+    store = death_store()
+    if len(request.args) == 0:
+        request.reply(str(store.count()) + ' deaths recorded')
+    elif request.args[0] == 'import':
+        if len(request.args) > 1:
+            request.warning('Usage: deaths import')
+            return
+        if request.permission_level < 4:
+            request.warning(errors.permission(4))
+            return
+        imported, failed = store.import_log(os.path.join(config('paths')['logs'], 'deaths.log'))
+        request.reply('imported ' + str(imported) + ' deaths' + (' (' + str(failed) + ' lines could not be parsed)' if failed else ''))
+    elif request.args[0] == 'top':
+        if len(request.args) > 2:
+            request.warning('Usage: deaths top [<number>]')
             return
-        success = args[0].lower() == 'win'
-        if len(args) == 3:
+        try:
+            limit = int(request.args[1]) if len(request.args) == 2 else 5
+        except ValueError:
+            request.warning('Usage: deaths top [<number>]')
+            return
+        causes = store.top_causes(limit=max(1, min(limit, 20)))
+        if len(causes):
+            request.reply('most common deaths: ' + ', '.join(cause + ' (' + str(number) + ')' for cause, number in causes))
+        else:
+            request.reply('no deaths recorded')
+    elif request.args[0] == 'week':
+        if len(request.args) > 1:
+            request.warning('Usage: deaths week')
+            return
+        since = datetime.now() - timedelta(days=7)
+        number = store.count(since=since)
+        if number:
+            request.reply(str(number) + ' deaths this week, most by ' + ', '.join(player + ' (' + str(player_deaths) + ')' for player, player_deaths in store.top_players(limit=3, since=since)))
+        else:
+            request.reply('no deaths this week')
+    elif len(request.args) == 1:
+        player = request.args[0]
+        try:
+            person = nicksub.Person(player, context=request.context)
+        except (ValueError, nicksub.PersonNotFoundError):
             try:
-                attacker = nicksub.Person(args[1], context=context)
-            except nicksub.PersonNotFoundError:
+                person = nicksub.Person(player, context='minecraft')
+            except (ValueError, nicksub.PersonNotFoundError):
                 try:
-                    attacker = nicksub.Person(args[1])
+                    person = nicksub.Person(player)
                 except nicksub.PersonNotFoundError:
-                    warning('Target not found')
-                    return
+                    person = None
+        if person is None:
+            number = store.count(minecraft=player)
+            latest = store.latest(minecraft=player)
+        else:
+            number = store.count(person=person.id)
+            latest = store.latest(person=person.id)
+        if number:
+            timestamp, message = latest[0]
+            request.reply(player + ' has died ' + str(number) + ' time' + ('' if number == 1 else 's') + ', most recently on ' + timestamp.strftime('%Y-%m-%d') + ': ' + message)
+        else:
+            request.reply(player + ' has not died yet')
+    else:
+        request.warning('Usage: deaths [<player> | top [<number>] | week | import]')
+
+@register_command('deathtweet', 'toggle death message tweeting', permission_level=3, usage='[on | off [<time>]]')
+def _command_deathtweet(request):
+    global DEATHTWEET
+    if not len(request.args):
+        request.reply('Deathtweeting is currently ' + ('enabled' if DEATHTWEET else 'disabled'))
+    elif request.args[0] == 'on':
+        DEATHTWEET = True
+        request.reply('Deathtweeting is now enabled')
+    elif request.args[0] == 'off':
+        def _reenable_death_tweets():
+            global DEATHTWEET
+            DEATHTWEET = True
+        
+        if len(request.args) > 2:
+            request.warning('Usage: achievementtweet [on | off [<time>]]')
+            return
+        elif len(request.args) == 2:
+            number = parse_timedelta(str(request.args[1]))
+            if number > 86400 and request.permission_level < 4:
+                request.warning(errors.permission(4))
+                return
+            Timer(number, _reenable_death_tweets).start()
+        elif request.permission_level < 4:
+            request.warning(errors.permission(4))
+            return
+        DEATHTWEET = False
+        request.reply('Deathtweeting is now disabled')
+    else:
+        request.warning('Usage: deathtweet [on | off [<time>]]')
+
+@register_command('dg', 'record an assassination attempt in the Death Games log, or show Death Games stats', permission_level=3, usage='(win | fail) [<attacker>] <target> | stats [<player>] | export')
+def _command_dg(request):
+    if len(request.args) in [1, 2] and request.args[0].lower() == 'stats':
+        if len(request.args) == 2:
             try:
-                target = nicksub.Person(args[2], context=context)
+                person = nicksub.Person(request.args[1], context=request.context)
             except nicksub.PersonNotFoundError:
                 try:
-                    target = nicksub.Person(args[2])
+                    person = nicksub.Person(request.args[1])
                 except nicksub.PersonNotFoundError:
-                    warning('Target not found')
+                    request.warning('Person not found')
                     return
+            stats = death_games_stats(person.id)
+            request.reply(person.display_name() + ': ' + str(stats['attacks']['win']) + ' successful and ' + str(stats['attacks']['fail']) + ' failed attempts, targeted ' + str(stats['targeted']['win'] + stats['targeted']['fail']) + ' times (survived ' + str(stats['targeted']['fail']) + ')')
         else:
-            if sender_person is None:
-                warning(errors.permission(3))
+            leaderboard = sorted(death_games_stats().items(), key=lambda person_stats: (-person_stats[1]['attacks']['win'], person_stats[1]['attacks']['fail'], person_stats[0]))
+            leaderboard = [(person_id, stats) for person_id, stats in leaderboard if stats['attacks']['win'] + stats['attacks']['fail'] > 0][:5]
+            if len(leaderboard):
+                request.reply('Death Games leaderboard: ' + ', '.join(person_id + ' (' + str(stats['attacks']['win']) + ' wins, ' + str(stats['attacks']['fail']) + ' fails)' for person_id, stats in leaderboard))
+            else:
+                request.reply('no Death Games attempts recorded')
+        return
+    if len(request.args) == 1 and request.args[0].lower() == 'export':
+        if request.permission_level < 4:
+            request.warning(errors.permission(4))
+            return
+        death_games_export()
+        request.reply('deathgames.json updated')
+        return
+    if len(request.args) not in [2, 3] or request.args[0].lower() not in ['win', 'fail']:
+        request.warning('Usage: dg (win | fail) [<attacker>] <target> | dg stats [<player>] | dg export')
+        return
+    success = request.args[0].lower() == 'win'
+    if len(request.args) == 3:
+        try:
+            attacker = nicksub.Person(request.args[1], context=request.context)
+        except nicksub.PersonNotFoundError:
+            try:
+                attacker = nicksub.Person(request.args[1])
+            except nicksub.PersonNotFoundError:
+                request.warning('Target not found')
                 return
-            attacker = sender_person
+        try:
+            target = nicksub.Person(request.args[2], context=request.context)
+        except nicksub.PersonNotFoundError:
             try:
-                target = nicksub.Person(args[1], context=context)
+                target = nicksub.Person(request.args[2])
             except nicksub.PersonNotFoundError:
-                try:
-                    target = nicksub.Person(args[1])
-                except nicksub.PersonNotFoundError:
-                    warning('Target not found')
-                    return
-        death_games_log(attacker, target, success)
-    
-    def _command_join(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if len(args) != 1:
-            warning('Usage: join <channel>')
-            return
-        chans = sorted(config('irc').get('channels', []))
-        if str(args[0]) in chans:
-            bot.joinchan(str(args[0]))
-            warning('I am already in ' + str(args[0]))
+                request.warning('Target not found')
+                return
+    else:
+        if request.sender_person is None:
+            request.warning(errors.permission(3))
             return
-        chans.append(str(args[0]))
-        chans = sorted(chans)
-        update_config(['irc', 'channels'], chans)
-        bot.joinchan(str(args[0]))
-    
-    def _command_lastseen(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        global LAST
-        if len(args):
-            player = args[0]
+        attacker = request.sender_person
+        try:
+            target = nicksub.Person(request.args[1], context=request.context)
+        except nicksub.PersonNotFoundError:
             try:
-                person = nicksub.Person(player, context=context)
+                target = nicksub.Person(request.args[1])
+            except nicksub.PersonNotFoundError:
+                request.warning('Target not found')
+                return
+    death_games_log(attacker, target, success)
+
+@register_command('fixstatus', 'update the server status on the website and in the channel topic', slow=True)
+def _command_fixstatus(request):
+    update_all(reply=request.reply)
+
+@register_command('join', 'make the bot join a channel', permission_level=4, usage='<channel>')
+def _command_join(request):
+    if len(request.args) != 1:
+        request.warning('Usage: join <channel>')
+        return
+    chans = sorted(config('irc').get('channels', []))
+    if str(request.args[0]) in chans:
+        bot.joinchan(str(request.args[0]))
+        request.warning('I am already in ' + str(request.args[0]))
+        return
+    chans.append(str(request.args[0]))
+    chans = sorted(chans)
+    update_config(['irc', 'channels'], chans)
+    bot.joinchan(str(request.args[0]))
+
+@register_command('lastseen', 'when was the player last seen logging in or out on Minecraft', usage='<player>')
+def _command_lastseen(request):
+    global LAST
+    if len(request.args):
+        player = request.args[0]
+        try:
+            person = nicksub.Person(player, context=request.context)
+        except (ValueError, nicksub.PersonNotFoundError):
+            try:
+                person = nicksub.Person(player, context='minecraft')
             except (ValueError, nicksub.PersonNotFoundError):
                 try:
-                    person = nicksub.Person(player, context='minecraft')
-                except (ValueError, nicksub.PersonNotFoundError):
-                    try:
-                        person = nicksub.Person(player)
-                    except nicksub.PersonNotFoundError:
-                        warning('No such person')
-                        return
-            if person.minecraft is None:
-                warning('No Minecraft nick for this person')
-                return
-            if person.minecraft in minecraft.online_players():
-                if reply_format == 'tellraw':
-                    reply([
+                    person = nicksub.Person(player)
+                except nicksub.PersonNotFoundError:
+                    request.warning('No such person')
+                    return
+        if person.minecraft is None:
+            request.warning('No Minecraft nick for this person')
+            return
+        if person.minecraft in online_players():
+            if request.reply_format == 'tellraw':
+                request.reply([
+                    {
+                        'text': player,
+                        'hoverEvent': {
+                            'action': 'show_text',
+                            'value': person.minecraft + ' in Minecraft'
+                        },
+                        'clickEvent': {
+                            'action': 'suggest_command',
+                            'value': person.minecraft + ': '
+                        },
+                        'color': 'gold',
+                    },
+                    {
+                        'text': ' is currently on the server.',
+                        'color': 'gold'
+                    }
+                ])
+            else:
+                request.reply(player + ' is currently on the server.')
+        else:
+            lastseen = last_seen(person.minecraft)
+            if lastseen is None:
+                request.reply('I have not seen ' + player + ' on the server yet.')
+            else:
+                if lastseen.date() == datetime.utcnow().date():
+                    datestr = 'today at ' + lastseen.strftime('%H:%M UTC')
+                    tellraw_date = [
                         {
-                            'text': player,
+                            'text': 'today',
                             'hoverEvent': {
                                 'action': 'show_text',
-                                'value': person.minecraft + ' in Minecraft'
+                                'value': lastseen.strftime('%Y-%m-%d')
                             },
-                            'clickEvent': {
-                                'action': 'suggest_command',
-                                'value': person.minecraft + ': '
+                            'color': 'gold'
+                        },
+                        {
+                            'text': ' at ' + lastseen.strftime('%H:%M UTC.'),
+                            'color': 'gold'
+                        }
+                    ]
+                elif lastseen.date() == datetime.utcnow().date() - timedelta(days=1):
+                    datestr = 'yesterday at ' + lastseen.strftime('%H:%M UTC')
+                    tellraw_date = [
+                        {
+                            'text': 'yesterday',
+                            'hoverEvent': {
+                                'action': 'show_text',
+                                'value': lastseen.strftime('%Y-%m-%d')
                             },
-                            'color': 'gold',
+                            'color': 'gold'
                         },
                         {
-                            'text': ' is currently on the server.',
+                            'text': ' at ' + lastseen.strftime('%H:%M UTC.'),
                             'color': 'gold'
                         }
-                    ])
+                    ]
                 else:
-                    reply(player + ' is currently on the server.')
-            else:
-                with LOGLOCK:
-                    lastseen = minecraft.last_seen(person.minecraft)
-                    if lastseen is None:
-                        reply('I have not seen ' + player + ' on the server yet.')
-                    else:
-                        if lastseen.date() == datetime.utcnow().date():
-                            datestr = 'today at ' + lastseen.strftime('%H:%M UTC')
-                            tellraw_date = [
-                                {
-                                    'text': 'today',
-                                    'hoverEvent': {
-                                        'action': 'show_text',
-                                        'value': lastseen.strftime('%Y-%m-%d')
-                                    },
-                                    'color': 'gold'
-                                },
-                                {
-                                    'text': ' at ' + lastseen.strftime('%H:%M UTC.'),
-                                    'color': 'gold'
-                                }
-                            ]
-                        elif lastseen.date() == datetime.utcnow().date() - timedelta(days=1):
-                            datestr = 'yesterday at ' + lastseen.strftime('%H:%M UTC')
-                            tellraw_date = [
-                                {
-                                    'text': 'yesterday',
-                                    'hoverEvent': {
-                                        'action': 'show_text',
-                                        'value': lastseen.strftime('%Y-%m-%d')
-                                    },
-                                    'color': 'gold'
-                                },
-                                {
-                                    'text': ' at ' + lastseen.strftime('%H:%M UTC.'),
-                                    'color': 'gold'
-                                }
-                            ]
-                        else:
-                            datestr = lastseen.strftime('on %Y-%m-%d at %H:%M UTC')
-                            tellraw_date = [
-                                {
-                                    'text': datestr + '.',
-                                    'color': 'gold'
-                                }
-                            ]
-                        if reply_format == 'tellraw':
-                            reply([
-                                {
-                                    'text': player,
-                                    'hoverEvent': {
-                                        'action': 'show_text',
-                                        'value': person.minecraft + ' in Minecraft'
-                                    },
-                                    'color': 'gold',
-                                },
-                                {
-                                    'text': ' was last seen ',
-                                    'color': 'gold'
-                                }
-                            ] + tellraw_date)
-                        else:
-                            reply(player + ' was last seen ' + datestr + '.')
-        else:
-            warning(errors.argc(1, len(args)))
-    
-    def _command_leak(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        messages = [(msg_type, msg_sender, msg_text) for msg_type, msg_sender, msg_headers, msg_text in bot.channel_data[config('irc')['main_channel']]['log'] if msg_type == 'ACTION' or (msg_type == 'PRIVMSG' and (not msg_text.startswith('!')) and (not msg_text.startswith(config('irc')['nick'] + ': ')) and (not msg_text.startswith(config('irc')['nick'] + ', ')))]
-        if len(args) == 0:
-            if len(messages):
-                messages = [messages[-1]]
-            else:
-                warning(errors.log)
-                return
-        elif len(args) == 1:
-            if re.match('[0-9]+$', args[0]) and len(messages) >= int(args[0]):
-                messages = messages[-int(args[0]):]
-            else:
-                warning(errors.log)
-                return
+                    datestr = lastseen.strftime('on %Y-%m-%d at %H:%M UTC')
+                    tellraw_date = [
+                        {
+                            'text': datestr + '.',
+                            'color': 'gold'
+                        }
+                    ]
+                if request.reply_format == 'tellraw':
+                    request.reply([
+                        {
+                            'text': player,
+                            'hoverEvent': {
+                                'action': 'show_text',
+                                'value': person.minecraft + ' in Minecraft'
+                            },
+                            'color': 'gold',
+                        },
+                        {
+                            'text': ' was last seen ',
+                            'color': 'gold'
+                        }
+                    ] + tellraw_date)
+                else:
+                    request.reply(player + ' was last seen ' + datestr + '.')
+    else:
+        request.warning(errors.argc(1, len(request.args)))
+
+@register_command('leak', 'tweet the last line_count (defaults to 1) chatlog lines', permission_level=2, usage='[<line_count>]', slow=True)
+def _command_leak(request):
+    messages = [(msg_type, msg_sender, msg_text) for msg_type, msg_sender, msg_headers, msg_text in bot.channel_data[config('irc')['main_channel']]['log'] if msg_type == 'ACTION' or (msg_type == 'PRIVMSG' and (not msg_text.startswith('!')) and (not msg_text.startswith(config('irc')['nick'] + ': ')) and (not msg_text.startswith(config('irc')['nick'] + ', ')))]
+    if len(request.args) == 0:
+        if len(messages):
+            messages = [messages[-1]]
         else:
-            warning(errors.argc(1, len(args)))
+            request.warning(errors.log)
             return
-        status = '\n'.join(((('* ' + nicksub.sub(msg_sender, 'irc', 'twitter') + ' ') if msg_type == 'ACTION' else ('<' + nicksub.sub(msg_sender, 'irc', 'twitter') + '> ')) + nicksub.textsub(message, 'irc', 'twitter')) for msg_type, msg_sender, message in messages)
-        if len(status + ' #ircleaks') <= 140:
-            if '\n' in status:
-                status += '\n#ircleaks'
-            else:
-                status += ' #ircleaks'
-        try:
-            twid = tweet(status)
-        except TwitterError as e:
-            warning('Error ' + str(e.status_code) + ': ' + str(e))
+    elif len(request.args) == 1:
+        if re.match('[0-9]+$', request.args[0]) and len(messages) >= int(request.args[0]):
+            messages = messages[-int(request.args[0]):]
         else:
-            tweet_url = 'https://twitter.com/' + config('twitter').get('screen_name', 'wurstmineberg') + '/status/' + str(twid)
-            minecraft.tellraw({
-                'text': 'leaked',
-                'clickEvent': {
-                    'action': 'open_url',
-                    'value': tweet_url
-                },
-                'color': 'gold'
-            })
-            bot.say(config('irc').get('main_channel', '#wurstmineberg'), 'leaked ' + tweet_url)
-    
-    def _command_opt(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if len(args) not in [1, 2]:
-            warning('Usage: opt <option> [true|false]')
+            request.warning(errors.log)
             return
-        option = str(args[0])
-        if sender_person is None:
-            warning(errors.permission(1))
-            return None
-        if len(args) == 1:
-            flag = sender_person.option(args[0])
-            is_default = sender_person.option_is_default(args[0])
-            reply('option ' + str(args[0]) + ' is ' + ('on' if flag else 'off') + ' ' + ('by default' if is_default else 'for you'))
-            return flag
-        else:
-            flag = bool(args[1] in [True, 1, '1', 'true', 'True', 'on', 'yes', 'y', 'Y'])
-            sender_person.set_option(str(args[0]), flag)
-            reply('option ' + str(args[0]) + ' is now ' + ('on' if flag else 'off') + ' for you')
-            return flag
-
-    def _command_markov(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        line=" ".join(args)
-        brain.learn(line)
-        reply(brain.reply(line))
+    else:
+        request.warning(errors.argc(1, len(request.args)))
         return
-    
-    def _command_pastemojira(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        link = True
-        if len(args) == 3 and args[2] == 'nolink':
-            link = False
-            args = args[:2]
-        elif len(args) == 2 and args[1] == 'nolink':
-            link = False
-            args = [args[0]]
-        if len(args) == 2:
-            project_key = str(args[0])
-            try:
-                issue_id = int(args[1])
-            except ValueError:
-                warning('Invalid issue ID: ' + str(args[0]))
-                return
-        elif len(args) == 1:
-            match = re.match('(https?://mojang.atlassian.net/browse/)?([A-Z]+)-([0-9]+)', str(args[0]))
-            if match:
-                project_key = str(match.group(2))
-                issue_id = int(match.group(3))
-            else:
-                project_key = 'MC'
-                try:
-                    issue_id = int(args[0])
-                except ValueError:
-                    warning('Invalid issue ID: ' + str(args[0]))
+    status = '\n'.join(((('* ' + nicksub.sub(msg_sender, 'irc', 'twitter') + ' ') if msg_type == 'ACTION' else ('<' + nicksub.sub(msg_sender, 'irc', 'twitter') + '> ')) + nicksub.textsub(message, 'irc', 'twitter')) for msg_type, msg_sender, message in messages)
+    if len(status + ' #ircleaks') <= 140:
+        if '\n' in status:
+            status += '\n#ircleaks'
         else:
-            reply('http://mojang.atlassian.net/browse/MC')
+            status += ' #ircleaks'
+    try:
+        twid = tweet(status)
+    except TwitterError as e:
+        request.warning('Error ' + str(e.status_code) + ': ' + str(e))
+    else:
+        tweet_url = 'https://twitter.com/' + config('twitter').get('screen_name', 'wurstmineberg') + '/status/' + str(twid)
+        ConsolePipeline.tellraw({
+            'text': 'leaked',
+            'clickEvent': {
+                'action': 'open_url',
+                'value': tweet_url
+            },
+            'color': 'gold'
+        })
+        IRCQueue.say(config('irc').get('main_channel', '#wurstmineberg'), 'leaked ' + tweet_url)
+
+@register_command('markov', 'Responds to input', usage='<input>')
+def _command_markov(request):
+    line=" ".join(request.args)
+    brain.learn(line)
+    request.reply(brain.reply(line))
+    return
+
+@register_command('mwiki', 'look something up in the Minecraft Wiki (separate several articles with |)', usage='(<url> | <article>...)', slow=True)
+def _command_mwiki(request):
+    return mwiki_lookup(args=request.args, permission_level=request.permission_level, reply=request.reply, sender=request.sender, sender_person=request.sender_person)
+
+@register_command('opt', 'change your options', permission_level=1, usage='<option> [true|false]')
+def _command_opt(request):
+    if len(request.args) not in [1, 2]:
+        request.warning('Usage: opt <option> [true|false]')
+        return
+    option = str(request.args[0])
+    if request.sender_person is None:
+        request.warning(errors.permission(1))
+        return None
+    if len(request.args) == 1:
+        flag = request.sender_person.option(request.args[0])
+        is_default = request.sender_person.option_is_default(request.args[0])
+        request.reply('option ' + str(request.args[0]) + ' is ' + ('on' if flag else 'off') + ' ' + ('by default' if is_default else 'for you'))
+        return flag
+    else:
+        flag = bool(request.args[1] in [True, 1, '1', 'true', 'True', 'on', 'yes', 'y', 'Y'])
+        request.sender_person.set_option(str(request.args[0]), flag)
+        request.reply('option ' + str(request.args[0]) + ' is now ' + ('on' if flag else 'off') + ' for you')
+        return flag
+
+@register_command('pastemojira', 'print the title of a bug in Mojangs bug tracker', usage='(<url> | [<project_key>] <issue_id>) [nolink]', slow=True)
+def _command_pastemojira(request):
+    args = request.args
+    link = True
+    if len(args) == 3 and args[2] == 'nolink':
+        link = False
+        args = args[:2]
+    elif len(args) == 2 and args[1] == 'nolink':
+        link = False
+        args = [args[0]]
+    if len(args) == 2:
+        project_key = str(args[0])
+        try:
+            issue_id = int(args[1])
+        except ValueError:
+            request.warning('Invalid issue ID: ' + str(args[0]))
             return
-        request = requests.get('http://mojang.atlassian.net/browse/' + project_key + '-' + str(issue_id))
-        if request.status_code == 200:
-            match = re.match('<title>\\[([A-Z]+)-([0-9]+)\\] (.+) - Mojira</title>', request.text.splitlines()[18])
-            if not match:
-                warning('could not get title')
-                return
-            project_key, issue_id, title = match.group(1, 2, 3)
-            if reply_format == 'tellraw':
-                reply({
-                    'text': '[' + project_key + '-' + issue_id + '] ' + title,
-                    'color': 'gold',
-                    'clickEvent': {
-                        'action': 'open_url',
-                        'value': 'http://mojang.atlassian.net/browse/' + project_key + '-' + issue_id
-                    }
-                })
-            else:
-                reply('[' + project_key + '-' + issue_id + '] ' + title + (' [http://mojang.atlassian.net/browse/' + project_key + '-' + issue_id + ']' if link else ''))
+    elif len(args) == 1:
+        match = re.match('(https?://mojang.atlassian.net/browse/)?([A-Z]+)-([0-9]+)', str(args[0]))
+        if match:
+            project_key = str(match.group(2))
+            issue_id = int(match.group(3))
         else:
-            warning('Error ' + str(request.status_code))
-            return
-    
-    def _command_pastetweet(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        link = True
-        if len(args) == 2 and args[1] == 'nolink':
-            link = False
-            args = [args[0]]
-        if len(args) == 1:
-            match = re.match('https?://twitter\\.com/[0-9A-Z_a-z]+/status/([0-9]+)', str(args[0]))
-            twid = match.group(1) if match else args[0]
+            project_key = 'MC'
             try:
-                reply(pastetweet(twid, link=link, tellraw=reply_format == 'tellraw'))
-            except TwitterError as e:
-                warning('Error ' + str(e.status_code) + ': ' + str(e))
-        else:
-            warning('Usage: pastetweet (<url> | <status_id>) [nolink]')
-    
-    def _command_people(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if len(args):
-            person = nicksub.Person(str(args[0]))
-            can_edit = permission_level >= 4 or sender_person == person
-            can_only_edit_self_error = "You can only edit your own profile. Only bot ops can edit someone else's profile."
-            if len(args) >= 2:
-                if args[1] == 'description':
-                    if len(args) == 2:
+                issue_id = int(args[0])
+            except ValueError:
+                request.warning('Invalid issue ID: ' + str(args[0]))
+                return
+    else:
+        request.reply('http://mojang.atlassian.net/browse/MC')
+        return
+    try:
+        issue = mojira_title(project_key + '-' + str(issue_id))
+    except ValueError as e:
+        request.warning(str(e))
+        return
+    except requests.exceptions.RequestException as e:
+        request.warning('Error: ' + str(e))
+        return
+    if issue is None:
+        request.warning('Error 404')
+        return
+    request.reply(mojira_paste(*issue, link=link, tellraw=request.reply_format == 'tellraw'))
+
+@register_command('pastetweet', 'print the contents of a tweet', usage='(<url> | <status_id>) [nolink]', slow=True)
+def _command_pastetweet(request):
+    args = request.args
+    link = True
+    if len(args) == 2 and args[1] == 'nolink':
+        link = False
+        args = [args[0]]
+    if len(args) == 1:
+        match = re.match('https?://twitter\\.com/[0-9A-Z_a-z]+/status/([0-9]+)', str(args[0]))
+        twid = match.group(1) if match else args[0]
+        try:
+            request.reply(pastetweet(twid, link=link, tellraw=request.reply_format == 'tellraw'))
+        except TwitterError as e:
+            request.warning('Error ' + str(e.status_code) + ': ' + str(e))
+    else:
+        request.warning('Usage: pastetweet (<url> | <status_id>) [nolink]')
+
+@register_command('people', 'people.json management', usage='[<person> [<attribute> [<value>]]]', slow=True)
+def _command_people(request):
+    if len(request.args):
+        person = nicksub.Person(str(request.args[0]))
+        can_edit = request.permission_level >= 4 or request.sender_person == person
+        can_only_edit_self_error = "You can only edit your own profile. Only bot ops can edit someone else's profile."
+        if len(request.args) >= 2:
+            follow = None
+            updated = None # the reply to an edit, sent once the transaction is written
+            with nicksub.transaction(): # one read and write of the people file for the whole edit
+                if request.args[1] == 'description':
+                    if len(request.args) == 2:
                         if person.description:
-                            reply(person.description)
+                            request.reply(person.description)
                         else:
-                            reply('no description')
+                            request.reply('no description')
                         return
                     elif can_edit:
-                        person.description = ' '.join(args[2:])
-                        reply('description updated')
+                        person.description = ' '.join(request.args[2:])
+                        updated = 'description updated'
                     else:
-                        warning(can_only_edit_self_error)
+                        request.warning(can_only_edit_self_error)
                         return
-                elif args[1] == 'name':
-                    if len(args) == 2:
+                elif request.args[1] == 'name':
+                    if len(request.args) == 2:
                         if person.name:
-                            reply(person.name)
+                            request.reply(person.name)
                         else:
-                            reply('no name, using id: ' + person.id)
+                            request.reply('no name, using id: ' + person.id)
                     elif can_edit:
                         had_name = person.name is not None
-                        person.name = ' '.join(args[2:])
-                        reply('name ' + ('changed' if had_name else 'added'))
+                        person.name = ' '.join(request.args[2:])
+                        updated = 'name ' + ('changed' if had_name else 'added')
                     else:
-                        warning(can_only_edit_self_error)
+                        request.warning(can_only_edit_self_error)
                         return
-                elif args[1] == 'reddit':
-                    if len(args) == 2:
+                elif request.args[1] == 'reddit':
+                    if len(request.args) == 2:
                         if person.reddit:
-                            reply('/u/' + person.reddit)
+                            request.reply('/u/' + person.reddit)
                         else:
-                            reply('no reddit nick')
+                            request.reply('no reddit nick')
                     elif can_edit:
                         had_reddit_nick = person.reddit is not None
-                        reddit_nick = args[2][3:] if args[2].startswith('/u/') else args[2]
+                        reddit_nick = request.args[2][3:] if request.args[2].startswith('/u/') else request.args[2]
                         person.reddit = reddit_nick
-                        reply('reddit nick ' + ('changed' if had_reddit_nick else 'added'))
+                        updated = 'reddit nick ' + ('changed' if had_reddit_nick else 'added')
                     else:
-                        warning(can_only_edit_self_error)
+                        request.warning(can_only_edit_self_error)
                         return
-                elif args[1] == 'twitter':
-                    if len(args) == 2:
+                elif request.args[1] == 'twitter':
+                    if len(request.args) == 2:
                         if person.twitter:
-                            reply('@' + person.twitter)
+                            request.reply('@' + person.twitter)
                         else:
-                            reply('no twitter nick')
+                            request.reply('no twitter nick')
                         return
                     elif can_edit:
-                        screen_name = args[2][1:] if args[2].startswith('@') else args[2]
-                        set_twitter(person, screen_name)
-                        reply('@' + config('twitter')['screen_name'] + ' is now following @' + screen_name)
+                        screen_name = request.args[2][1:] if request.args[2].startswith('@') else request.args[2]
+                        person.twitter = screen_name
+                        follow = screen_name # after the transaction, so the people file isn't locked while waiting for Twitter
                     else:
-                        warning(can_only_edit_self_error)
+                        request.warning(can_only_edit_self_error)
                         return
-                elif args[1] == 'website':
-                    if len(args) == 2:
+                elif request.args[1] == 'website':
+                    if len(request.args) == 2:
                         if person.website:
-                            reply(person.website)
+                            request.reply(person.website)
                         else:
-                            reply('no website')
+                            request.reply('no website')
                     elif can_edit:
                         had_website = person.website is not None
-                        person.website = str(args[2])
-                        reply('website ' + ('changed' if had_website else 'added'))
+                        person.website = str(request.args[2])
+                        updated = 'website ' + ('changed' if had_website else 'added')
                     else:
-                        warning(can_only_edit_self_error)
+                        request.warning(can_only_edit_self_error)
                         return
-                elif args[1] == 'wiki':
-                    if len(args) == 2:
+                elif request.args[1] == 'wiki':
+                    if len(request.args) == 2:
                         if person.wiki:
-                            reply(person.wiki)
+                            request.reply(person.wiki)
                         else:
-                            reply('no wiki account')
+                            request.reply('no wiki account')
                     elif can_edit:
                         had_wiki = person.wiki is not None
-                        person.wiki = str(args[2])
-                        reply('wiki account ' + ('changed' if had_wiki else 'added'))
+                        person.wiki = str(request.args[2])
+                        updated = 'wiki account ' + ('changed' if had_wiki else 'added')
                 else:
-                    warning('no such people attribute: ' + str(args[1]))
+                    request.warning('no such people attribute: ' + str(request.args[1]))
                     return
-            else:
-                if 'name' in person:
-                    reply('person with id ' + str(args[0]) + ' and name ' + person['name'])
-                else:
-                    reply('person with id ' + str(args[0]) + ' and no name (id will be used as name)')
+            if updated is not None:
+                request.reply(updated)
+            if follow is not None:
+                twitter_follow(follow)
+                request.reply('@' + config('twitter')['screen_name'] + ' is now following @' + follow)
         else:
-            reply('http://wurstmineberg.de/people')
-    
-    def _command_ping(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if random.randrange(1024) == 0:
-            reply('BWO' + 'R' * random.randint(3, 20) + 'N' * random.randint(1, 5) + 'G') # PINGCEPTION
-        else:
-            reply('pong')
-    
-    def _command_quit(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        quitMsg = ' '.join(args) if len(args) else None
-        minecraft.tellraw({
-            'text': ('Shutting down the bot: ' + quitMsg) if quitMsg else 'Shutting down the bot...',
+            if 'name' in person:
+                request.reply('person with id ' + str(request.args[0]) + ' and name ' + person['name'])
+            else:
+                request.reply('person with id ' + str(request.args[0]) + ' and no name (id will be used as name)')
+    else:
+        request.reply('http://wurstmineberg.de/people')
+
+@register_command('ping', 'say pong')
+def _command_ping(request):
+    if random.randrange(1024) == 0:
+        request.reply('BWO' + 'R' * random.randint(3, 20) + 'N' * random.randint(1, 5) + 'G') # PINGCEPTION
+    else:
+        request.reply('pong')
+
+@register_command('quit', 'stop the bot with a custom quit message', permission_level=4, usage='[<quit_message>...]')
+def _command_quit(request):
+    quitMsg = ' '.join(request.args) if len(request.args) else None
+    ConsolePipeline.tellraw({
+        'text': ('Shutting down the bot: ' + quitMsg) if quitMsg else 'Shutting down the bot...',
+        'color': 'red'
+    })
+    IRCQueue.say(config('irc')['main_channel'], ('bye, ' + quitMsg) if quitMsg else random.choice(config('irc').get('quit_messages', ['bye'])))
+    # sys.exit skips the cleanup at the end of run, so finish pending work here
+    TweetQueue.stop()
+    death_games_flush()
+    ConsolePipeline.flush()
+    IRCQueue.flush()
+    bot.disconnect(quitMsg if quitMsg else 'bye')
+    bot.stop()
+    sys.exit()
+
+@register_command('raw', 'send raw message to IRC', permission_level=4, usage='<raw_message>...')
+def _command_raw(request):
+    if len(request.args):
+        bot.send(' '.join(request.args))
+    else:
+        request.warning(errors.argc(1, len(request.args), atleast=True))
+
+@register_command('reload', 'reload the config and people files now instead of when a change is noticed', permission_level=4)
+def _command_reload(request):
+    reload_config()
+    nicksub.reload_config()
+    request.reply('Config reloaded.')
+
+@register_command('restart', 'restart the Minecraft server or the bot', permission_level=4, usage='[minecraft | bot]', slow=True)
+def _command_restart(request):
+    global PREVIOUS_TOPIC
+    if len(request.args) == 0 or (len(request.args) == 1 and request.args[0] == 'bot'):
+        # restart the bot
+        ConsolePipeline.tellraw({
+            'text': 'Restarting the bot...',
             'color': 'red'
         })
-        bot.say(config('irc')['main_channel'], ('bye, ' + quitMsg) if quitMsg else random.choice(config('irc').get('quit_messages', ['bye'])))
-        bot.disconnect(quitMsg if quitMsg else 'bye')
+        IRCQueue.say(config('irc')['main_channel'], random.choice(config('irc').get('quit_messages', ['brb'])))
+        # sys.exit skips the cleanup at the end of run, so finish pending work here
+        TweetQueue.stop()
+        death_games_flush()
+        ConsolePipeline.flush()
+        IRCQueue.flush()
+        bot.disconnect('brb')
         bot.stop()
+        daemon_context = newDaemonContext('/var/run/wurstmineberg/wurstminebot.pid')
+        stop(daemon_context)
+        start(daemon_context)
         sys.exit()
-    
-    def _command_raw(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if len(args):
-            bot.send(' '.join(args))
+    elif len(request.args) == 1 and request.args[0] == 'minecraft':
+        # restart the Minecraft server
+        PREVIOUS_TOPIC = (config('irc')['topic'] + ' | ' if 'topic' in config('irc') and config('irc')['topic'] is not None else '') + 'The server is restarting…'
+        bot.topic(config('irc')['main_channel'], PREVIOUS_TOPIC)
+        success = minecraft.restart(args=request.args, permission_level=request.permission_level, reply=request.reply, sender=request.sender)
+        invalidate_online_players() # players were kicked
+        if success:
+            request.reply('Server restarted.')
         else:
-            warning(errors.argc(1, len(args), atleast=True))
-    
-    def _command_restart(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        global PREVIOUS_TOPIC
-        if len(args) == 0 or (len(args) == 1 and args[0] == 'bot'):
-            # restart the bot
-            minecraft.tellraw({
-                'text': 'Restarting the bot...',
-                'color': 'red'
-            })
-            bot.say(config('irc')['main_channel'], random.choice(config('irc').get('quit_messages', ['brb'])))
-            bot.disconnect('brb')
-            bot.stop()
-            context = newDaemonContext('/var/run/wurstmineberg/wurstminebot.pid')
-            stop(context)
-            start(context)
-            sys.exit()
-        elif len(args) == 1 and args[0] == 'minecraft':
-            # restart the Minecraft server
-            PREVIOUS_TOPIC = (config('irc')['topic'] + ' | ' if 'topic' in config('irc') and config('irc')['topic'] is not None else '') + 'The server is restarting…'
-            bot.topic(config('irc')['main_channel'], PREVIOUS_TOPIC)
-            if minecraft.restart(args=args, permission_level=permission_level, reply=reply, sender=sender):
-                reply('Server restarted.')
+            request.reply('Could not restart the server!')
+        update_topic()
+    else:
+        request.warning('Usage: restart [minecraft | bot]')
+
+@register_command('stats', 'show how many log lines the bot has processed, how the tweet and IRC queues are doing, how many status updates and slow commands were run, and how many tellraws were written')
+def _command_stats(request):
+    line_stats = log_line_stats()
+    if len(line_stats):
+        request.reply('log lines: ' + ', '.join(line_type + ' ' + str(count) + ' (' + '{:.2f}'.format(rate) + '/s)' for line_type, (count, rate) in sorted(line_stats.items())))
+    else:
+        request.reply('no log lines processed yet')
+    tweet_stats = TweetQueue.stats()
+    request.reply('tweets: ' + str(tweet_stats['queued']) + ' queued, ' + str(tweet_stats['sent']) + ' sent, ' + str(tweet_stats['failed']) + ' failed, latency ' + '{:.1f}'.format(tweet_stats['latency_avg']) + ' s average, ' + '{:.1f}'.format(tweet_stats['latency_max']) + ' s max')
+    request.reply('status updates: ' + str(update_all_later.requests) + ' requested, ' + str(update_all_later.runs) + ' run')
+    irc_stats = IRCQueue.stats()
+    request.reply('IRC messages: ' + str(irc_stats['sent']) + ' sent, ' + str(irc_stats['merged']) + ' merged, ' + ', '.join(lane + ' ' + str(irc_stats['lanes'][lane]['queued']) + ' queued (' + '{:.1f}'.format(irc_stats['lanes'][lane]['latency_avg']) + ' s average latency)' for lane in IRCQueue.LANES))
+    pool_stats = CommandPool.stats()
+    request.reply('slow commands: ' + str(pool_stats['submitted']) + ' run, ' + str(pool_stats['pending']) + ' pending, ' + str(pool_stats['refused']) + ' refused')
+    console_stats = ConsolePipeline.stats()
+    request.reply('tellraws: ' + str(console_stats['requested']) + ' sent, ' + str(console_stats['written']) + ' written (' + '{:.2f}'.format(console_stats['writes_per_sec']) + '/s) in ' + str(console_stats['batches']) + ' batches, ' + '{:.1f}'.format(console_stats['batch_avg']) + ' per batch on average, ' + str(console_stats['batch_max']) + ' max')
+
+@register_command('status', 'print some server status')
+def _command_status(request):
+    if minecraft.status():
+        if request.context != 'minecraft':
+            players = online_players()
+            if len(players):
+                request.reply('Online players: ' + ', '.join(nicksub.sub(nick, 'minecraft', request.context) for nick in players))
             else:
-                reply('Could not restart the server!')
-            update_topic()
+                request.reply('The server is currently empty.')
+        version = minecraft.version()
+        if version is None:
+            request.reply('unknown Minecraft version')
+        elif request.reply_format == 'tellraw':
+            request.reply({
+                'text': 'Minecraft version ',
+                'extra': [
+                    {
+                        'text': version,
+                        'clickEvent': {
+                            'action': 'open_url',
+                            'value': 'http://minecraft.gamepedia.com/Version_history' + ('/Development_versions#' if 'pre' in version or version[2:3] == 'w' else '#') + version
+                        }
+                    }
+                ]
+            })
         else:
-            warning('Usage: restart [minecraft | bot]')
-    
-    def _command_status(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if minecraft.status():
-            if context != 'minecraft':
-                players = minecraft.online_players()
-                if len(players):
-                    reply('Online players: ' + ', '.join(nicksub.sub(nick, 'minecraft', context) for nick in players))
-                else:
-                    reply('The server is currently empty.')
-            version = minecraft.version()
-            if version is None:
-                reply('unknown Minecraft version')
-            elif reply_format == 'tellraw':
-                reply({
-                    'text': 'Minecraft version ',
+            request.reply('Minecraft version ' + version)
+    else:
+        request.reply('The server is currently offline.')
+
+@register_command('stop', 'stop the Minecraft server or the bot', permission_level=4, usage='[minecraft | bot]', slow=True)
+def _command_stop(request):
+    global PREVIOUS_TOPIC
+    if len(request.args) == 0 or (len(request.args) == 1 and request.args[0] == 'bot'):
+        # stop the bot
+        request.args = [] # no quit message
+        return _command_quit(request)
+    elif len(request.args) == 1 and request.args[0] == 'minecraft':
+        # stop the Minecraft server
+        PREVIOUS_TOPIC = (config('irc')['topic'] + ' | ' if 'topic' in config('irc') and config('irc')['topic'] is not None else '') + 'The server is down for now. Blame ' + str(request.sender) + '.'
+        bot.topic(config('irc')['main_channel'], PREVIOUS_TOPIC)
+        success = minecraft.stop(args=request.args, permission_level=request.permission_level, reply=request.reply, sender=request.sender)
+        invalidate_online_players() # players were kicked
+        if success:
+            request.reply('Server stopped.')
+        else:
+            request.warning('The server could not be stopped! D:')
+    else:
+        request.warning('Usage: stop [minecraft | bot]')
+
+@register_command('time', 'reply with the current time')
+def _command_time(request):
+    telltime(func=request.reply)
+
+@register_command('topic', 'temporarily set the channel topic', permission_level=4, usage='<topic>...')
+def _command_topic(request):
+    if len(request.args):
+        update_config(['irc', 'topic'], ' '.join(str(arg) for arg in request.args))
+        update_topic()
+    else:
+        request.warning(errors.argc(1, len(request.args), atleast=True))
+
+@register_command('tweet', 'tweet message', permission_level=4, usage='<message>...', slow=True)
+def _command_tweet(request):
+    if len(request.args):
+        status = nicksub.textsub(' '.join(request.args), request.context, 'twitter')
+        try:
+            twid = tweet(status)
+        except TwitterError as e:
+            request.warning('Error ' + str(e.status_code) + ': ' + str(e))
+        else:
+            url = 'https://twitter.com/wurstmineberg/status/' + str(twid)
+            if request.context == 'minecraft':
+                ConsolePipeline.tellraw({
+                    'text': '',
                     'extra': [
                         {
-                            'text': version,
+                            'text': url,
+                            'color': 'gold',
                             'clickEvent': {
                                 'action': 'open_url',
-                                'value': 'http://minecraft.gamepedia.com/Version_history' + ('/Development_versions#' if 'pre' in version or version[2:3] == 'w' else '#') + version
+                                'value': url
                             }
                         }
                     ]
                 })
             else:
-                reply('Minecraft version ' + version)
-        else:
-            reply('The server is currently offline.')
-    
-    def _command_stop(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        global PREVIOUS_TOPIC
-        if len(args) == 0 or (len(args) == 1 and args[0] == 'bot'):
-            # stop the bot
-            return _command_quit(args=[], permission_level=permission_level, reply=reply, sender=sender)
-        elif len(args) == 1 and args[0] == 'minecraft':
-            # stop the Minecraft server
-            PREVIOUS_TOPIC = (config('irc')['topic'] + ' | ' if 'topic' in config('irc') and config('irc')['topic'] is not None else '') + 'The server is down for now. Blame ' + str(sender) + '.'
-            bot.topic(config('irc')['main_channel'], PREVIOUS_TOPIC)
-            if minecraft.stop(args=args, permission_level=permission_level, reply=reply, sender=sender):
-                reply('Server stopped.')
-            else:
-                warning('The server could not be stopped! D:')
-        else:
-            warning('Usage: stop [minecraft | bot]')
-    
-    def _command_time(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        telltime(func=reply)
-    
-    def _command_topic(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if len(args):
-            update_config(['irc', 'topic'], ' '.join(str(arg) for arg in args))
-            update_topic()
-        else:
-            warning(errors.argc(1, len(args), atleast=True))
-    
-    def _command_tweet(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if len(args):
-            status = nicksub.textsub(' '.join(args), context, 'twitter')
-            try:
-                twid = tweet(status)
-            except TwitterError as e:
-                warning('Error ' + str(e.status_code) + ': ' + str(e))
+                ConsolePipeline.tellraw(pastetweet(twid, tellraw=True))
+            if request.context == 'irc' and request.chan == config('irc')['main_channel']:
+                IRCQueue.say(request.chan, url, lane='bulk')
             else:
-                url = 'https://twitter.com/wurstmineberg/status/' + str(twid)
-                if context == 'minecraft':
-                    minecraft.tellraw({
-                        'text': '',
-                        'extra': [
-                            {
-                                'text': url,
-                                'color': 'gold',
-                                'clickEvent': {
-                                    'action': 'open_url',
-                                    'value': url
-                                }
-                            }
-                        ]
-                    })
-                else:
-                    minecraft.tellraw(pastetweet(twid, tellraw=True))
-                if context == 'irc' and chan == config('irc')['main_channel']:
-                    bot.say(chan, url)
-                else:
-                    for line in pastetweet(twid).splitlines():
-                        bot.say(config('irc')['main_channel'] if chan is None else chan, line)
-        else:
-            warning(errors.argc(1, len(args), atleast=True))
+                for line in pastetweet(twid).splitlines():
+                    IRCQueue.say(config('irc')['main_channel'] if request.chan is None else request.chan, line, lane='bulk')
+    else:
+        request.warning(errors.argc(1, len(request.args), atleast=True))
+
+@register_command('update', 'update Minecraft', permission_level=4, usage='[snapshot <snapshot_id> | <version>]', slow=True)
+def _command_update(request):
+    global PREVIOUS_TOPIC
     
-    def _command_update(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        global PREVIOUS_TOPIC
-        
-        if len(args):
-            if args[0] == 'snapshot':
-                if len(args) == 2:
-                    PREVIOUS_TOPIC = (config('irc')['topic'] + ' | ' if 'topic' in config('irc') and config('irc')['topic'] is not None else '') + 'The server is being updated, wait a sec.'
-                    bot.topic(config('irc')['main_channel'], PREVIOUS_TOPIC)
-                    version, is_snapshot, version_text = minecraft.update(args[1], snapshot=True, reply=reply)
-                else:
-                    warning('Usage: update [snapshot <snapshot_id> | <version>]')
-            elif len(args) == 1:
+    if len(request.args):
+        if request.args[0] == 'snapshot':
+            if len(request.args) == 2:
                 PREVIOUS_TOPIC = (config('irc')['topic'] + ' | ' if 'topic' in config('irc') and config('irc')['topic'] is not None else '') + 'The server is being updated, wait a sec.'
                 bot.topic(config('irc')['main_channel'], PREVIOUS_TOPIC)
-                version, is_snapshot, version_text = minecraft.update(args[0], snapshot=False, reply=reply)
+                version, is_snapshot, version_text = minecraft.update(request.args[1], snapshot=True, reply=request.reply)
             else:
-                warning('Usage: update [snapshot <snapshot_id> | <version>]')
-        else:
+                request.warning('Usage: update [snapshot <snapshot_id> | <version>]')
+        elif len(request.args) == 1:
             PREVIOUS_TOPIC = (config('irc')['topic'] + ' | ' if 'topic' in config('irc') and config('irc')['topic'] is not None else '') + 'The server is being updated, wait a sec.'
             bot.topic(config('irc')['main_channel'], PREVIOUS_TOPIC)
-            version, is_snapshot, version_text = minecraft.update(snapshot=True, reply=reply)
-        try:
-            twid = tweet('Server updated to ' + version_text + '! Wheee! See http://minecraft.gamepedia.com/Version_history' + ('/Development_versions#' if is_snapshot else '#') + version + ' for details.')
-        except TwitterError as e:
-            reply(('...' if context == 'minecraft' else '…') + 'done updating, but the announcement tweet failed.')
+            version, is_snapshot, version_text = minecraft.update(request.args[0], snapshot=False, reply=request.reply)
         else:
-            reply(('...' if context == 'minecraft' else '…') + 'done [https://twitter.com/' + config('twitter').get('screen_name', 'wurstmineberg') + '/status/' + str(twid) + ']')
-        update_topic()
-    
-    def _command_version(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        reply('I am wurstminebot version ' + str(__version__) + ', running on init-minecraft version ' + str(minecraft.__version__))
-    
-    def _command_whitelist(args=[], permission_level=0, reply=reply, sender=sender, sender_person=None):
-        if len(args) in [2, 3]:
-            try:
-                if len(args) == 3 and args[2] is not None and len(args[2]):
-                    screen_name = args[2][1:] if args[2].startswith('@') else args[2]
-                else:
-                    screen_name = None
-                minecraft.whitelist_add(args[0], args[1])
-            except ValueError:
-                warning('id ' + str(args[0]) + ' already exists')
+            request.warning('Usage: update [snapshot <snapshot_id> | <version>]')
+    else:
+        PREVIOUS_TOPIC = (config('irc')['topic'] + ' | ' if 'topic' in config('irc') and config('irc')['topic'] is not None else '') + 'The server is being updated, wait a sec.'
+        bot.topic(config('irc')['main_channel'], PREVIOUS_TOPIC)
+        version, is_snapshot, version_text = minecraft.update(snapshot=True, reply=request.reply)
+    invalidate_online_players() # the server was restarted
+    try:
+        twid = tweet('Server updated to ' + version_text + '! Wheee! See http://minecraft.gamepedia.com/Version_history' + ('/Development_versions#' if is_snapshot else '#') + version + ' for details.')
+    except TwitterError as e:
+        request.reply(('...' if request.context == 'minecraft' else '…') + 'done updating, but the announcement tweet failed.')
+    else:
+        request.reply(('...' if request.context == 'minecraft' else '…') + 'done [https://twitter.com/' + config('twitter').get('screen_name', 'wurstmineberg') + '/status/' + str(twid) + ']')
+    update_topic()
+
+@register_command('version', 'reply with the current version of wurstminebot and init-minecraft')
+def _command_version(request):
+    request.reply('I am wurstminebot version ' + str(__version__) + ', running on init-minecraft version ' + str(minecraft.__version__))
+
+@register_command('whitelist', 'add person to whitelist', permission_level=4, usage='<unique_id> <minecraft_name> [<twitter_username>]', slow=True)
+def _command_whitelist(request):
+    if len(request.args) in [2, 3]:
+        try:
+            if len(request.args) == 3 and request.args[2] is not None and len(request.args[2]):
+                screen_name = request.args[2][1:] if request.args[2].startswith('@') else request.args[2]
             else:
-                reply(str(args[1]) + ' is now whitelisted')
-                if len(args) == 3:
-                    set_twitter(nicksub.Person(str(args[0])), str(args[2]))
-                    reply('@' + config('twitter')['screen_name'] + ' is now following @' + str(args[2]))
+                screen_name = None
+            minecraft.whitelist_add(request.args[0], request.args[1])
+        except ValueError:
+            request.warning('id ' + str(request.args[0]) + ' already exists')
         else:
-            warning('Usage: whitelist <unique_id> <minecraft_name> [<twitter_username>]')
-    
-    commands = {
-        'achievementtweet': {
-            'description': 'toggle achievement message tweeting',
-            'function': _command_achievementtweet,
-            'permission_level': 3,
-            'usage': '[on | off [<time>]]'
-        },
-        'alias': {
-            'description': 'add, edit, or remove an alias (you can use aliases like regular commands)',
-            'function': _command_alias,
-            'permission_level': 2,
-            'usage': '<alias_name> [<text>...]'
-        },
-        'command': {
-            'description': 'perform Minecraft server command',
-            'function': _command_command,
-            'permission_level': 4,
-            'usage': '<command> [<arguments>...]'
-        },
-        'deathtweet': {
-            'description': 'toggle death message tweeting',
-            'function': _command_deathtweet,
-            'permission_level': 3,
-            'usage': '[on | off [<time>]]'
-        },
-        'dg': {
-            'description': 'record an assassination attempt in the Death Games log',
-            'function': _command_dg,
-            'permission_level': 3,
-            'usage': '(win | fail) [<attacker>] <target>'
-        },
-        'fixstatus': {
-            'description': 'update the server status on the website and in the channel topic',
-            'function': update_all,
-            'permission_level': 0,
-            'usage': None
-        },
-        'join': {
-            'description': 'make the bot join a channel',
-            'function': _command_join,
-            'permission_level': 4,
-            'usage': '<channel>'
-        },
-        'lastseen': {
-            'description': 'when was the player last seen logging in or out on Minecraft',
-            'function': _command_lastseen,
-            'permission_level': 0,
-            'usage': '<player>'
-        },
-        'leak': {
-            'description': 'tweet the last line_count (defaults to 1) chatlog lines',
-            'function': _command_leak,
-            'permission_level': 2,
-            'usage': '[<line_count>]'
-        },
-        'markov':{
-            'description': 'Responds to input',
-            'function': _command_markov,
-            'permission_level':0,
-            'usage': '<input>'
-        },
-        'mwiki': {
-            'description': 'look something up in the Minecraft Wiki',
-            'function': mwiki_lookup,
-            'permission_level': 0,
-            'usage': '(<url> | <article>...)'
-        },
-        'opt': {
-            'description': 'change your options',
-            'function': _command_opt,
-            'permission_level': 1,
-            'usage': '<option> [true|false]'
-        },
-        'pastemojira': {
-            'description': 'print the title of a bug in Mojangs bug tracker',
-            'function': _command_pastemojira,
-            'permission_level': 0,
-            'usage': '(<url> | [<project_key>] <issue_id>) [nolink]'
-        },
-        'pastetweet': {
-            'description': 'print the contents of a tweet',
-            'function': _command_pastetweet,
-            'permission_level': 0,
-            'usage': '(<url> | <status_id>) [nolink]'
-        },
-        'people': {
-            'description': 'people.json management',
-            'function': _command_people,
-            'permission_level': 0,
-            'usage': '[<person> [<attribute> [<value>]]]'
-        },
-        'ping': {
-            'description': 'say pong',
-            'function': _command_ping,
-            'permission_level': 0,
-            'usage': None
-        },
-        'quit': {
-            'description': 'stop the bot with a custom quit message',
-            'function': _command_quit,
-            'permission_level': 4,
-            'usage': '[<quit_message>...]'
-        },
-        'raw': {
-            'description': 'send raw message to IRC',
-            'function': _command_raw,
-            'permission_level': 4,
-            'usage': '<raw_message>...'
-        },
-        'restart': {
-            'description': 'restart the Minecraft server or the bot',
-            'function': _command_restart,
-            'permission_level': 4,
-            'usage': '[minecraft | bot]'
-        },
-        'status': {
-            'description': 'print some server status',
-            'function': _command_status,
-            'permission_level': 0,
-            'usage': None
-        },
-        'stop': {
-            'description': 'stop the Minecraft server or the bot',
-            'function': _command_stop,
-            'permission_level': 4,
-            'usage': '[minecraft | bot]'
-        },
-        'time': {
-            'description': 'reply with the current time',
-            'function': _command_time,
-            'permission_level': 0,
-            'usage': None
-        },
-        'topic': {
-            'description': 'temporarily set the channel topic',
-            'function': _command_topic,
-            'permission_level': 4,
-            'usage': '<topic>...'
-        },
-        'tweet': {
-            'description': 'tweet message',
-            'function': _command_tweet,
-            'permission_level': 4,
-            'usage': '<message>...'
-        },
-        'update': {
-            'description': 'update Minecraft',
-            'function': _command_update,
-            'permission_level': 4,
-            'usage': '[snapshot <snapshot_id> | <version>]'
-        },
-        'version': {
-            'description': 'reply with the current version of wurstminebot and init-minecraft',
-            'function': _command_version,
-            'permission_level': 0,
-            'usage': None
-        },
-        'whitelist': {
-            'description': 'add person to whitelist',
-            'function': _command_whitelist,
-            'permission_level': 4,
-            'usage': '<unique_id> <minecraft_name> [<twitter_username>]'
-        }
-    }
-    
+            request.reply(str(request.args[1]) + ' is now whitelisted')
+            if len(request.args) == 3:
+                # a transaction of its own, since whitelist_add writes the people file without nicksub
+                set_twitter(nicksub.Person(str(request.args[0])), screen_name)
+                request.reply('@' + config('twitter')['screen_name'] + ' is now following @' + screen_name)
+    else:
+        request.warning('Usage: whitelist <unique_id> <minecraft_name> [<twitter_username>]')
+
+def command(cmd, args=[], context=None, chan=None, reply=None, reply_format=None, sender=None, sender_person=None, addressing=None):
     if sender_person is None:
         try:
             sender_person = nicksub.Person(sender, context=context)
@@ -1688,6 +2922,7 @@ def command(cmd, args=[], context=None, chan=None, reply=None, reply_format=None
             sender_person = None
     elif sender is None:
         sender = sender_person.nick(context, default=sender_person.id)
+    request = CommandRequest(args, context=context, chan=chan, reply=reply, reply_format=reply_format, sender=sender, sender_person=sender_person)
     
     if cmd.lower() == 'help':
         if len(args) >= 2:
@@ -1714,29 +2949,22 @@ def command(cmd, args=[], context=None, chan=None, reply=None, reply_format=None
             help_text = errors.unknown(args[0])
         if context == 'irc':
             for line in help_text.splitlines():
-                bot.say(sender, line)
+                IRCQueue.say(sender, line, lane='bulk')
         else:
-            reply(help_text)
+            request.reply(help_text)
     elif cmd.lower() in commands:
-        if nicksub.sub(sender, context, 'irc', strict=False) in [None] + config('irc')['op_nicks']:
-            sender_permission_level = 4
-        elif sender_person is not None:
-            sender_permission_level = 1
-            if sender_person.id in config('ops'):
-                sender_permission_level = 4
-            elif sender_person.whitelisted():
-                sender_permission_level = 3
-            elif sender_person.invited():
-                sender_permission_level = 2
-        else:
-            sender_permission_level = 0
-        if sender_permission_level >= commands[cmd].get('permission_level', 0):
-            return commands[cmd]['function'](args=args, permission_level=sender_permission_level, reply=reply, sender=sender, sender_person=sender_person)
+        command_info = commands[cmd.lower()]
+        request.permission_level = sender_permission_level(sender, sender_person, context)
+        if request.permission_level >= command_info['permission_level']:
+            if command_info['slow'] and CommandPool.running():
+                CommandPool.submit(request, command_info['function'])
+            else:
+                return command_info['function'](request)
         else:
-            warning(errors.permission(commands[cmd].get('permission_level', 0)))
+            request.warning(errors.permission(command_info['permission_level']))
     elif cmd in config('aliases'):
         if context == 'irc' and chan == config('irc').get('main_channel', '#wurstmineberg'):
-            minecraft.tellraw([
+            ConsolePipeline.tellraw([
                 {
                     'text': '<' + nicksub.sub(sender, 'irc', 'minecraft') + '>',
                     'color': 'aqua',
@@ -1758,7 +2986,7 @@ def command(cmd, args=[], context=None, chan=None, reply=None, reply_format=None
                 }
             ])
         elif context == 'minecraft':
-            minecraft.tellraw([
+            ConsolePipeline.tellraw([
                 {
                     'text': sender,
                     'color': 'gold'
@@ -1773,22 +3001,21 @@ def command(cmd, args=[], context=None, chan=None, reply=None, reply_format=None
                 }
             ])
         if context == 'irc' and chan is not None:
-            bot.say(chan, sender + ': ' + config('aliases')[cmd])
+            IRCQueue.say(chan, sender + ': ' + config('aliases')[cmd], lane='bulk')
         elif context == 'irc' and sender is not None:
-            bot.say(sender, config('aliases')[cmd])
+            IRCQueue.say(sender, config('aliases')[cmd], lane='bulk')
         elif context == 'minecraft':
-            bot.say(config('irc').get('main_channel'), '<' + (sender if sender_person is None else sender_person.irc_nick()) + '> ' + config('aliases')[cmd])
+            IRCQueue.say(config('irc').get('main_channel'), '<' + (sender if sender_person is None else sender_person.irc_nick()) + '> ' + config('aliases')[cmd], lane='relay')
     else:
-        warning(errors.unknown(cmd))
+        request.warning(errors.unknown(cmd))
 
 def endMOTD(sender, headers, message):
     for chan in config('irc')['channels']:
         bot.joinchan(chan)
-    bot.say(config('irc')['main_channel'], "aaand I'm back.")
-    minecraft.tellraw({'text': "aaand I'm back.", 'color': 'gold'})
+    IRCQueue.say(config('irc')['main_channel'], "aaand I'm back.")
+    ConsolePipeline.tellraw({'text': "aaand I'm back.", 'color': 'gold'})
     _debug_print("aaand I'm back.")
     update_all()
-    threading.Timer(20, minecraft.update_status).start()
     InputLoop.start()
 
 bot.bind('376', endMOTD)
@@ -1798,7 +3025,7 @@ def action(sender, headers, message):
         if sender == config('irc').get('nick', 'wurstminebot'):
             return
         if headers[0] == config('irc')['main_channel']:
-            minecraft.tellraw({'text': '', 'extra': [{'text': '* ' + nicksub.sub(sender, 'irc', 'minecraft'), 'color': 'aqua', 'hoverEvent': {'action': 'show_text', 'value': sender + ' in ' + headers[0]}, 'clickEvent': {'action': 'suggest_command', 'value': nicksub.sub(sender, 'irc', 'minecraft') + ': '}}, {'text': ' '}, {'text': nicksub.textsub(message, 'irc', 'minecraft'), 'color': 'aqua'}]})
+            ConsolePipeline.tellraw({'text': '', 'extra': [{'text': '* ' + nicksub.sub(sender, 'irc', 'minecraft'), 'color': 'aqua', 'hoverEvent': {'action': 'show_text', 'value': sender + ' in ' + headers[0]}, 'clickEvent': {'action': 'suggest_command', 'value': nicksub.sub(sender, 'irc', 'minecraft') + ': '}}, {'text': ' '}, {'text': nicksub.textsub(message, 'irc', 'minecraft'), 'color': 'aqua'}]})
     except SystemExit:
         _debug_print('Exit in ACTION')
         InputLoop.stop()
@@ -1818,11 +3045,9 @@ def join(sender, headers, message):
         chan = message
     else:
         return
-    with open(config('paths')['people']) as people_json:
-        people = json.load(people_json)
     for person in nicksub.everyone():
         if person.minecraft is not None and person.option('sync_join_part'):
-            minecraft.tellraw([
+            ConsolePipeline.tellraw([
                 {
                     'text': sender,
                     'color': 'yellow',
@@ -1844,7 +3069,7 @@ def nick(sender, headers, message):
         return
     for person in nicksub.everyone():
         if person.minecraft is not None and person.option('sync_nick_changes'):
-            minecraft.tellraw([
+            ConsolePipeline.tellraw([
                 {
                     'text': sender + ' is now known as ',
                     'color': 'yellow'
@@ -1871,18 +3096,54 @@ def part(sender, headers, message):
         chans = ', '.join(chans[:-1]) + ', and ' + chans[-1]
     for person in nicksub.everyone():
         if person.minecraft is not None and person.option('sync_join_part'):
-            minecraft.tellraw({
+            ConsolePipeline.tellraw({
                 'text': sender + ' left ' + chans,
                 'color': 'yellow'
             }, player=person.minecraft)
 
 bot.bind('PART', part)
 
-def privmsg(sender, headers, message):
-    def botsay(msg):
+def _auto_paste(function, arg, sender, chan):
+    """Pastes a Mojira issue or tweet linked in chan to IRC and Minecraft. The lookup runs in the CommandPool like a slow command, so it doesn't block IRC input."""
+    def reply(msg):
         for line in msg.splitlines():
-            bot.say(config('irc')['main_channel'], line)
+            IRCQueue.say(chan, line, lane='bulk')
     
+    request = CommandRequest([arg], context='irc', chan=chan, reply=reply, sender=sender)
+    if CommandPool.running():
+        CommandPool.submit(request, function)
+    else:
+        function(request)
+
+def _paste_mojira_link(request):
+    try:
+        issue = mojira_title(request.args[0])
+        if issue is None:
+            request.warning('Error pasting mojira ticket: no such issue')
+        else:
+            ConsolePipeline.tellraw(mojira_paste(*issue, tellraw=True))
+            request.reply(mojira_paste(*issue))
+    except SystemExit:
+        raise
+    except Exception as e:
+        request.warning('Error pasting mojira ticket: ' + str(e))
+        _debug_print('Exception while pasting mojira ticket:')
+        if config('debug', False):
+            traceback.print_exc()
+
+def _paste_tweet_link(request):
+    try:
+        ConsolePipeline.tellraw(pastetweet(request.args[0], link=False, tellraw=True))
+        request.reply(pastetweet(request.args[0], link=False, tellraw=False))
+    except SystemExit:
+        raise
+    except Exception as e:
+        request.warning('Error while pasting tweet: ' + str(e))
+        _debug_print('Exception while pasting tweet:')
+        if config('debug', False):
+            traceback.print_exc()
+
+def privmsg(sender, headers, message):
     try:
         _debug_print('[irc] <' + sender + '> ' + message)
         if sender == config('irc').get('nick', 'wurstminebot'):
@@ -1896,7 +3157,7 @@ def privmsg(sender, headers, message):
                     except SystemExit:
                         raise
                     except Exception as e:
-                        bot.say(headers[0], sender + ': Error: ' + str(e))
+                        IRCQueue.say(headers[0], sender + ': Error: ' + str(e), lane='bulk')
                         _debug_print('Exception in ' + str(cmd[0]) + ' command from ' + str(sender) + ' to ' + str(headers[0]) + ':')
                         if config('debug', False):
                             traceback.print_exc()
@@ -1908,13 +3169,13 @@ def privmsg(sender, headers, message):
                     except SystemExit:
                         raise
                     except Exception as e:
-                        bot.say(headers[0], sender + ': Error: ' + str(e))
+                        IRCQueue.say(headers[0], sender + ': Error: ' + str(e), lane='bulk')
                         _debug_print('Exception in ' + str(cmd[0]) + ' command from ' + str(sender) + ' to ' + str(headers[0]) + ':')
                         if config('debug', False):
                             traceback.print_exc()
             elif headers[0] == config('irc')['main_channel']:
                 if re.match('https?://mojang\\.atlassian\\.net/browse/[A-Z]+-[0-9]+', message):
-                    minecraft.tellraw([
+                    ConsolePipeline.tellraw([
                         {
                             'text': '<' + nicksub.sub(sender, 'irc', 'minecraft') + '>',
                             'color': 'aqua',
@@ -1939,18 +3200,9 @@ def privmsg(sender, headers, message):
                             }
                         }
                     ])
-                    try:
-                        command('pastemojira', args=[message, 'nolink'], reply_format='tellraw')
-                        command('pastemojira', args=[message, 'nolink'], context='irc', sender=sender, chan=headers[0], reply=botsay)
-                    except SystemExit:
-                        raise
-                    except Exception as e:
-                        bot.say(headers[0], 'Error pasting mojira ticket: ' + str(e))
-                        _debug_print('Exception while pasting mojira ticket:')
-                        if config('debug', False):
-                            traceback.print_exc()
+                    _auto_paste(_paste_mojira_link, re.match('https?://mojang\\.atlassian\\.net/browse/([A-Z]+-[0-9]+)', message).group(1), sender, headers[0])
                 elif re.match('https?://twitter\\.com/[0-9A-Z_a-z]+/status/[0-9]+$', message):
-                    minecraft.tellraw([
+                    ConsolePipeline.tellraw([
                         {
                             'text': '<' + nicksub.sub(sender, 'irc', 'minecraft') + '>',
                             'color': 'aqua',
@@ -1975,22 +3227,12 @@ def privmsg(sender, headers, message):
                             }
                         }
                     ])
-                    try:
-                        twid = re.match('https?://twitter\\.com/[0-9A-Z_a-z]+/status/([0-9]+)$', message).group(1)
-                        minecraft.tellraw(pastetweet(twid, link=False, tellraw=True))
-                        botsay(pastetweet(twid, link=False, tellraw=False))
-                    except SystemExit:
-                        raise
-                    except Exception as e:
-                        bot.say(headers[0], 'Error while pasting tweet: ' + str(e))
-                        _debug_print('Exception while pasting tweet:')
-                        if config('debug', False):
-                            traceback.print_exc()
+                    _auto_paste(_paste_tweet_link, re.match('https?://twitter\\.com/[0-9A-Z_a-z]+/status/([0-9]+)$', message).group(1), sender, headers[0])
                 else:
                     match = re.match('([a-z0-9]+:[^ ]+)(.*)$', message)
                     if match:
                         url, remaining_message = match.group(1, 2)
-                        minecraft.tellraw([
+                        ConsolePipeline.tellraw([
                             {
                                 'text': '<' + nicksub.sub(sender, 'irc', 'minecraft') + '>',
                                 'color': 'aqua',
@@ -2020,7 +3262,7 @@ def privmsg(sender, headers, message):
                             }
                         ])
                     else:
-                        minecraft.tellraw({
+                        ConsolePipeline.tellraw({
                             'text': '',
                             'extra': [
                                 {
@@ -2052,7 +3294,7 @@ def privmsg(sender, headers, message):
                 except SystemExit:
                     raise
                 except Exception as e:
-                    bot.say(sender, 'Error: ' + str(e))
+                    IRCQueue.say(sender, 'Error: ' + str(e), lane='bulk')
                     _debug_print('Exception in ' + str(cmd[0]) + ' command from ' + str(sender) + ' to query:')
                     if config('debug', False):
                         traceback.print_exc()
@@ -2069,7 +3311,19 @@ def privmsg(sender, headers, message):
 bot.bind('PRIVMSG', privmsg)
 
 def run():
+    if USE_ASYNCIO:
+        if sys.version_info < (3, 7):
+            sys.exit('--asyncio requires Python 3.7 or later')
+        import aiocore
+        aiocore.install(sys.modules[__name__])
     bot.debugging(config('debug'))
+    backfill = threading.Thread(target=_last_seen_backfill, name='wurstminebot lastseen backfill')
+    backfill.daemon = True
+    backfill.start()
+    TweetQueue.start()
+    ConsolePipeline.start()
+    IRCQueue.start()
+    CommandPool.start()
     TimeLoop.start()
     try:
         bot.run()
@@ -2082,6 +3336,11 @@ def run():
         sys.exit(1)
     InputLoop.stop()
     TimeLoop.stop()
+    CommandPool.stop()
+    TweetQueue.stop()
+    ConsolePipeline.stop()
+    IRCQueue.stop()
+    death_games_flush()
 
 def newDaemonContext(pidfilename):
     if not os.geteuid() == 0:
@@ -2140,6 +3399,181 @@ def stop(context):
         print("Service did not shutdown correctly. Cleaning up...")
         context.pidfile.break_lock()
 
+def _replay_ignore(*args, **kwargs):
+    pass
+
+class _ReplayStandIn:
+    """Accepts and ignores any method call. Used in place of the IRC bot during a replay."""
+    channel_data = {}
+    keepGoing = True
+    
+    def __getattr__(self, name):
+        return _replay_ignore
+
+class _ReplayTwitter:
+    """Pretends to successfully post tweets. Used in place of the Twitter client during a replay."""
+    class Response:
+        status_code = 200
+        
+        def __init__(self, status_id):
+            self.status_id = status_id
+        
+        def json(self):
+            return {'id': self.status_id, 'id_str': str(self.status_id)}
+    
+    def __init__(self):
+        self.requests = 0
+    
+    def request(self, resource, params=None):
+        self.requests += 1
+        return self.Response(self.requests)
+
+def synthetic_log(num_lines, mix):
+    """Returns a list of generated server log lines.
+    
+    mix maps line types ('achievement', 'action', 'chat', 'command', 'death', 'join', 'leave', 'other', 'ignored') to relative weights.
+    """
+    players = list(nicksub.minecraftNicks()) or ['Player' + str(i) for i in range(20)]
+    words = ['hi', 'lol', 'where', 'is', 'the', 'nether', 'portal', 'brb', 'creeper', 'ok', 'diamonds', 'wheee'] + players
+    death_messages = ['was slain by Zombie', 'was shot by Skeleton', 'was blown up by Creeper', 'drowned', 'fell from a high place', 'tried to swim in lava', 'hit the ground too hard', 'starved to death']
+    achievements = ['Taking Inventory', 'Getting Wood', 'Benchmarking', 'Hot Topic', 'DIAMONDS!', 'The End.']
+    line_types = sorted(mix)
+    ret = []
+    for i in range(num_lines):
+        timestamp = time.strftime('[%H:%M:%S]', time.gmtime(i))
+        player = random.choice(players)
+        random_index = random.uniform(0.0, sum(mix.values()))
+        index = 0.0
+        for line_type in line_types:
+            if random_index - index < mix[line_type]:
+                break
+            else:
+                index += mix[line_type]
+        if line_type == 'achievement':
+            text = player + ' has just earned the achievement [' + random.choice(achievements) + ']'
+        elif line_type == 'action':
+            text = '* ' + player + ' ' + ' '.join(random.choice(words) for _ in range(random.randint(1, 8)))
+        elif line_type == 'chat':
+            text = '<' + player + '> ' + ' '.join(random.choice(words) for _ in range(random.randint(1, 15)))
+        elif line_type == 'command':
+            text = '<' + player + '> !' + random.choice(['ping', 'time', 'status', 'lastseen ' + random.choice(players)])
+        elif line_type == 'death':
+            text = player + ' ' + random.choice(death_messages)
+        elif line_type == 'join':
+            text = player + ' joined the game'
+        elif line_type == 'leave':
+            text = player + ' left the game'
+        elif line_type == 'ignored':
+            ret.append(timestamp + ' [User Authenticator #1/INFO]: UUID of player ' + player + ' is 00000000000000000000000000000000')
+            continue
+        else:
+            text = random.choice(['Saving chunks for level \'world\'/Overworld', 'Stopping server', 'Done (2.345s)! For help, type "help" or "?"', player + '[/127.0.0.1:12345] logged in with entity id 42 at (0.5, 64.0, 0.5)'])
+        ret.append(timestamp + ' [Server thread/INFO]: ' + text)
+    return ret
+
+def replay(log_lines, rate=0):
+    """Feeds log lines through InputLoop.process_log_line and measures how long each line takes.
+    
+    IRC, Twitter, and the Minecraft server are replaced with stand-ins for the duration of the replay: nothing is said on IRC, tweeted, or sent to the server. Commands are not executed, and timers are not started. Files the log processing writes to (logins.log, deaths.log, the deaths database, deathgames.json and its journal) are redirected to a temporary directory. Returns a dict with the total time taken and a list of (line type, seconds) pairs.
+    """
+    global Timer, bot, command, config, TweetQueue, twitter
+    real = {
+        'bot': bot,
+        'command': command,
+        'config': config,
+        'timer': Timer,
+        'tweet_queue': TweetQueue,
+        'twitter': twitter
+    }
+    real_minecraft = dict((name, getattr(minecraft, name)) for name in ('online_players', 'tellraw', 'update_status', 'update_whitelist'))
+    real_online_players = dict(_online_players, players=list(_online_players['players']))
+    tmpdir = tempfile.mkdtemp(prefix='wurstminebot-replay-')
+    loginslog_path = os.path.join(real['config']('paths')['logs'], 'logins.log')
+    if os.path.exists(loginslog_path):
+        shutil.copy(loginslog_path, os.path.join(tmpdir, 'logins.log')) # so that returning players aren't welcomed as new
+    else:
+        open(os.path.join(tmpdir, 'logins.log'), 'w').close()
+    with open(os.path.join(tmpdir, 'deathgames.json'), 'w') as deathgames:
+        json.dump({'log': []}, deathgames)
+    
+    def _replay_config(key=None, default_value=None):
+        ret = real['config'](key, default_value)
+        if key == 'paths':
+            ret = dict(ret)
+            ret['logs'] = tmpdir
+            ret['deathgames'] = os.path.join(tmpdir, 'deathgames.json')
+            ret['deathgamesjournal'] = os.path.join(tmpdir, 'deathgames.jsonl')
+            ret['deathsdb'] = os.path.join(tmpdir, 'deaths.sqlite')
+        return ret
+    
+    class _ReplayTimer:
+        def __init__(self, *args, **kwargs):
+            pass
+        
+        def cancel(self):
+            pass
+        
+        def start(self):
+            pass
+    
+    bot = _ReplayStandIn()
+    command = _replay_ignore
+    config = _replay_config
+    Timer = _ReplayTimer
+    TweetQueue = type(real['tweet_queue'])()
+    TweetQueue.start()
+    twitter = _ReplayTwitter()
+    minecraft.online_players = lambda *args, **kwargs: []
+    minecraft.tellraw = minecraft.update_status = minecraft.update_whitelist = _replay_ignore
+    timings = []
+    try:
+        replay_start = time.time()
+        for index, log_line in enumerate(log_lines):
+            if rate > 0:
+                delay = replay_start + index / rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            line_start = time.time()
+            event = InputLoop.process_log_line(log_line)
+            timings.append(('error' if event is None else event.type, time.time() - line_start))
+        TweetQueue.stop()
+        total = time.time() - replay_start
+    finally:
+        TweetQueue.stop()
+        bot = real['bot']
+        command = real['command']
+        config = real['config']
+        Timer = real['timer']
+        TweetQueue = real['tweet_queue']
+        twitter = real['twitter']
+        for name, value in real_minecraft.items():
+            setattr(minecraft, name, value)
+        _online_players.update(real_online_players)
+        update_all_later.timer = update_status_later.timer = None # the replay's timers never run
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return {
+        'timings': timings,
+        'total': total
+    }
+
+def print_replay_stats(replay_stats):
+    def _percentile(values, percent):
+        if not len(values):
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
+    
+    def _ms(seconds):
+        return '{:.3f} ms'.format(seconds * 1000)
+    
+    timings = replay_stats['timings']
+    total = replay_stats['total']
+    all_latencies = sorted(seconds for line_type, seconds in timings)
+    print('Replayed ' + str(len(timings)) + ' lines in ' + '{:.3f}'.format(total) + ' s (' + '{:.1f}'.format(len(timings) / total if total > 0 else 0.0) + ' lines/sec)')
+    print('Latency per line: p50 ' + _ms(_percentile(all_latencies, 50)) + ', p99 ' + _ms(_percentile(all_latencies, 99)) + ', max ' + _ms(_percentile(all_latencies, 100)))
+    for line_type in sorted(set(line_type for line_type, seconds in timings)):
+        latencies = sorted(seconds for timing_type, seconds in timings if timing_type == line_type)
+        print('  ' + line_type + ': ' + str(len(latencies)) + ' lines, ' + '{:.1f}'.format(100 * sum(latencies) / max(sum(all_latencies), 1e-9)) + '% of time, p50 ' + _ms(_percentile(latencies, 50)) + ', p99 ' + _ms(_percentile(latencies, 99)))
+
 if __name__ == '__main__':
     pidfilename = "/var/run/wurstmineberg/wurstminebot.pid"
     if arguments['start']:
@@ -2155,5 +3589,13 @@ if __name__ == '__main__':
     elif arguments['status']:
         pidfile = daemon.pidlockfile.PIDLockFile(pidfilename)
         print('wurstminebot ' + ('is' if status(pidfile) else 'is not') + ' running.')
+    elif arguments['replay']:
+        if arguments['--synthetic']:
+            mix = dict((line_type, float(weight)) for line_type, weight in (pair.split('=') for pair in arguments['--mix'].split(',')))
+            log_lines = synthetic_log(int(arguments['--synthetic']), mix)
+        else:
+            with open(arguments['<logfile>'], encoding='utf-8', errors='replace') as logfile:
+                log_lines = logfile.read().splitlines()
+        print_replay_stats(replay(log_lines, rate=float(arguments['--rate'])))
     else:
         run()